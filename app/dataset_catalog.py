@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+from collections.abc import Mapping
 from dataclasses import dataclass
+from types import MappingProxyType
 
 
 @dataclass(frozen=True)
@@ -214,10 +216,20 @@ DATASET_CATALOG: tuple[DatasetCatalogItem, ...] = (
 )
 
 
-DATASET_CATALOG_BY_ID = {item.id: item for item in DATASET_CATALOG}
-DATASET_CATALOG_BY_DB_NAME = {item.db_name: item for item in DATASET_CATALOG}
+# Read-only views: the catalog is static, so lookups never need to copy or rebuild.
+DATASET_CATALOG_BY_ID: Mapping[str, DatasetCatalogItem] = MappingProxyType(
+    {item.id: item for item in DATASET_CATALOG}
+)
+DATASET_CATALOG_BY_DB_NAME: Mapping[str, DatasetCatalogItem] = MappingProxyType(
+    {item.db_name: item for item in DATASET_CATALOG}
+)
+DATASET_CATALOG_BY_PAIR: Mapping[tuple[str, str], DatasetCatalogItem] = (
+    MappingProxyType(
+        {(item.repo_id, item.config_name): item for item in DATASET_CATALOG}
+    )
+)
 
-MANAGED_DATASET_KEYS = (
+MANAGED_DATASET_KEYS: frozenset[tuple[str, str]] = frozenset(
     {
         (item.repo_id, item.config_name)
         for item in DATASET_CATALOG
@@ -230,3 +242,28 @@ MANAGED_DATASET_KEYS = (
         for supplemental in item.supplemental_configs
     }
 )
+
+
+def _group_managed_configs_by_repo() -> dict[str, frozenset[str]]:
+    grouped: dict[str, set[str]] = {}
+    for repo_id, config_name in MANAGED_DATASET_KEYS:
+        grouped.setdefault(repo_id, set()).add(config_name)
+    return {repo_id: frozenset(configs) for repo_id, configs in grouped.items()}
+
+
+MANAGED_CONFIGS_BY_REPO: Mapping[str, frozenset[str]] = MappingProxyType(
+    _group_managed_configs_by_repo()
+)
+
+
+def _regulator_table_candidates(item: DatasetCatalogItem) -> tuple[str, ...]:
+    """Ordered metadata tables to search for regulator identifiers of a dataset."""
+    candidates: list[str] = [f"{item.db_name}_meta"]
+    for supplemental in item.supplemental_configs:
+        candidates.extend([f"{supplemental.db_name}_meta", supplemental.db_name])
+    return tuple(candidates)
+
+
+REGULATOR_TABLE_CANDIDATES: Mapping[str, tuple[str, ...]] = MappingProxyType(
+    {item.db_name: _regulator_table_candidates(item) for item in DATASET_CATALOG}
+)
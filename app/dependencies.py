@@ -12,5 +12,9 @@ def get_vdb(request: Request) -> VirtualDB:
 
 
 def get_vdb_lock(request: Request) -> threading.Lock:
-    """FastAPI dependency that provides the VirtualDB threading lock."""
+    """FastAPI dependency that provides the VirtualDB threading lock.
+
+    The lock serializes use of the VirtualDB's single DuckDB connection, which
+    is not safe for concurrent use. Hold it only around VirtualDB calls.
+    """
     return request.app.state.vdb_lock
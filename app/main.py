@@ -1,30 +1,43 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import threading
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from typing import AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from tfbpapi import VirtualDB
 
 from app.config import get_settings
 from app.exceptions import register_exception_handlers
 from app.routers import active_set_config, analysis, datacard, discovery, query, schema
+from app.routers._query_utils import _invalidate_schema_cache
+from app.routers.active_set_config import _prefetch_hf_metadata
 
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-    """Initialize VirtualDB at startup, tear down on shutdown."""
+    """Initialize VirtualDB at startup, tear down on shutdown.
+
+    HF catalog metadata is prewarmed in the background so the first
+    /dataset-catalog request does not pay for the network round-trips.
+    """
     settings = get_settings()
     logger.info("Initializing VirtualDB from %s", settings.config_path)
     vdb = VirtualDB(settings.config_path, token=settings.hf_token)
     app.state.vdb = vdb
     app.state.vdb_lock = threading.Lock()
+    prewarm = asyncio.create_task(_prefetch_hf_metadata(settings.hf_token))
     yield
+    prewarm.cancel()
+    with suppress(asyncio.CancelledError):
+        await prewarm
+    _invalidate_schema_cache()
 
 
 def create_app() -> FastAPI:
@@ -36,6 +49,7 @@ def create_app() -> FastAPI:
         description="REST API for Transcription Factor Binding & Perturbation data",
         version="0.1.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     app.add_middleware(
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import Any
+
+import orjson
+import pandas as pd
+from fastapi.responses import ORJSONResponse
+
+
+def _json_default(value: object) -> object:
+    """Serialize pandas scalars and other DuckDB result values orjson rejects."""
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class RecordsJSONResponse(ORJSONResponse):
+    """ORJSON response for pre-built payloads containing raw DataFrame records.
+
+    Handlers return it directly to skip response-model validation of large
+    record lists; values orjson cannot encode are converted by ``_json_default``.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
@@ -2,32 +2,53 @@
 
 from __future__ import annotations
 
+import base64
+import binascii
+import io
 import math
-import re
-
+import string
+import threading
+import weakref
+from collections.abc import Iterator
+from functools import lru_cache
+
+import orjson
+import pandas as pd
+from cachetools import TTLCache
 from tfbpapi import VirtualDB
 
-from app.dataset_catalog import DATASET_CATALOG_BY_DB_NAME
-from app.schemas import IntersectionRequest
-
-_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
-_NUMERIC_TYPE_TOKENS = (
-    "TINYINT",
-    "SMALLINT",
-    "INTEGER",
-    "BIGINT",
-    "HUGEINT",
-    "UTINYINT",
-    "USMALLINT",
-    "UINTEGER",
-    "UBIGINT",
-    "UHUGEINT",
+from app.dataset_catalog import REGULATOR_TABLE_CANDIDATES
+from app.responses import _json_default
+from app.schemas import FilterOption, IntersectionRequest, SourceSummaryEntry
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+_ARROW_BATCH_ROWS = 8192
+_MAX_CATEGORICAL_VALUES = 100
+_SUMMARY_EXCLUDED_FIELDS = frozenset({"sample_id", "sra_accession"})
+
+_IDENTIFIER_START = frozenset((string.ascii_letters + "_").encode("ascii"))
+_IDENTIFIER_CHARS = _IDENTIFIER_START | frozenset(string.digits.encode("ascii"))
+_INTEGER_TYPE_NAMES = frozenset(
+    {
+        "TINYINT",
+        "SMALLINT",
+        "INTEGER",
+        "BIGINT",
+        "HUGEINT",
+        "UTINYINT",
+        "USMALLINT",
+        "UINTEGER",
+        "UBIGINT",
+        "UHUGEINT",
+    }
+)
+_NUMERIC_TYPE_NAMES = _INTEGER_TYPE_NAMES | {
     "REAL",
     "FLOAT",
     "DOUBLE",
     "DECIMAL",
     "NUMERIC",
-)
+}
 _REGULATOR_IDENTIFIER_CANDIDATES = (
     "regulator",
     "tf",
@@ -37,24 +58,70 @@ _REGULATOR_IDENTIFIER_CANDIDATES = (
 )
 _SAMPLE_IDENTIFIER_CANDIDATES = ("sample_id", "sra_accession", "id")
 
-
+# Table schemas per VirtualDB instance; weak keys let replaced instances drop out.
+_SCHEMA_CACHE: weakref.WeakKeyDictionary[VirtualDB, dict[str, dict[str, str]]] = (
+    weakref.WeakKeyDictionary()
+)
+_TABLES_CACHE: weakref.WeakKeyDictionary[VirtualDB, frozenset[str]] = (
+    weakref.WeakKeyDictionary()
+)
+_FIELDS_CACHE: weakref.WeakKeyDictionary[VirtualDB, dict[str, list[str]]] = (
+    weakref.WeakKeyDictionary()
+)
+_COMMON_FIELDS_CACHE: weakref.WeakKeyDictionary[VirtualDB, list[str]] = (
+    weakref.WeakKeyDictionary()
+)
+_COMPARATIVE_CACHE: weakref.WeakKeyDictionary[
+    VirtualDB, dict[tuple[str, str], bool]
+] = weakref.WeakKeyDictionary()
+# Source summaries also expire, since view contents can change without a rebuild.
+_SOURCE_SUMMARY_TTL_SECONDS = 5 * 60
+_SOURCE_SUMMARY_CACHE: weakref.WeakKeyDictionary[
+    VirtualDB, TTLCache[str, SourceSummaryEntry]
+] = weakref.WeakKeyDictionary()
+_source_summary_lock = threading.Lock()
+# Row counts, analysis totals and filter options per table, keyed by
+# (stat, table, *args).
+_TABLE_STATS_CACHE: weakref.WeakKeyDictionary[
+    VirtualDB, TTLCache[tuple[str, ...], object]
+] = weakref.WeakKeyDictionary()
+_table_stats_lock = threading.Lock()
+# Distinct values back UI pickers, so they go stale after a minute, not five.
+_DISTINCT_VALUES_TTL_SECONDS = 60
+_DISTINCT_VALUES_CACHE: weakref.WeakKeyDictionary[
+    VirtualDB, TTLCache[tuple[str, str], list]
+] = weakref.WeakKeyDictionary()
+_distinct_values_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
 def _validate_identifier(name: str) -> str:
-    """Validate that a string is a safe SQL identifier."""
-    if not _IDENTIFIER_RE.match(name):
+    """Validate that a string is a safe SQL identifier (``[A-Za-z_][A-Za-z0-9_]*``)."""
+    raw = name.encode("ascii", "ignore")
+    if (
+        not raw
+        or len(raw) != len(name)
+        or raw[0] not in _IDENTIFIER_START
+        or not _IDENTIFIER_CHARS.issuperset(raw)
+    ):
         raise ValueError(f"Invalid identifier: {name!r}")
     return name
 
 
-def _qi(name: str) -> str:
-    """Quote a validated identifier for use in SQL (handles reserved keywords)."""
-    return f'"{name}"'
+def _first_present(candidates: tuple[str, ...], fields: list[str]) -> str | None:
+    """Return the first candidate present in ``fields`` using one hashed pass."""
+    available = frozenset(fields)
+    for candidate in candidates:
+        if candidate in available:
+            return candidate
+    return None
 
 
 def _resolve_regulator_identifier(fields: list[str], table: str) -> str:
     """Pick the best available regulator identifier field."""
-    for candidate in _REGULATOR_IDENTIFIER_CANDIDATES:
-        if candidate in fields:
-            return candidate
+    resolved = _first_present(_REGULATOR_IDENTIFIER_CANDIDATES, fields)
+    if resolved is not None:
+        return resolved
 
     available = ", ".join(fields[:12]) if fields else "<none>"
     raise ValueError(
@@ -65,9 +132,9 @@ def _resolve_regulator_identifier(fields: list[str], table: str) -> str:
 
 def _resolve_sample_identifier(fields: list[str], table: str) -> str:
     """Pick the available sample identifier field for join/filter operations."""
-    for fallback in _SAMPLE_IDENTIFIER_CANDIDATES:
-        if fallback in fields:
-            return fallback
+    resolved = _first_present(_SAMPLE_IDENTIFIER_CANDIDATES, fields)
+    if resolved is not None:
+        return resolved
 
     available = ", ".join(fields[:12]) if fields else "<none>"
     raise ValueError(
@@ -91,12 +158,143 @@ def _is_numeric_column_type(column_type: str | None) -> bool:
     """Return whether a DuckDB column type should be treated as numeric."""
     if not column_type:
         return False
-    upper = str(column_type).upper()
-    return any(token in upper for token in _NUMERIC_TYPE_TOKENS)
+    # Parameterized types such as DECIMAL(18,2) are matched on their base name.
+    base_type = str(column_type).upper().split("(", 1)[0].strip()
+    return base_type in _NUMERIC_TYPE_NAMES
+
+
+def _is_integer_column_type(column_type: str | None) -> bool:
+    """Return whether a DuckDB column type is an exact integer type."""
+    return bool(column_type) and str(column_type).upper() in _INTEGER_TYPE_NAMES
+
+
+def _invalidate_schema_cache() -> None:
+    """Drop all cached table schemas (call whenever VirtualDB is rebuilt)."""
+    _SCHEMA_CACHE.clear()
+    _TABLES_CACHE.clear()
+    _FIELDS_CACHE.clear()
+    _COMMON_FIELDS_CACHE.clear()
+    _COMPARATIVE_CACHE.clear()
+    with _source_summary_lock:
+        _SOURCE_SUMMARY_CACHE.clear()
+    with _table_stats_lock:
+        _TABLE_STATS_CACHE.clear()
+    with _distinct_values_lock:
+        _DISTINCT_VALUES_CACHE.clear()
+
+
+def _table_set(vdb: VirtualDB) -> frozenset[str]:
+    """Return the names of all registered views, cached per VirtualDB instance."""
+    tables = _TABLES_CACHE.get(vdb)
+    if tables is None:
+        tables = _TABLES_CACHE[vdb] = frozenset(vdb.tables())
+    return tables
+
+
+def _table_fields(vdb: VirtualDB, table: str) -> list[str]:
+    """Return the column names of a table, cached per VirtualDB instance.
+
+    Callers must not mutate the returned list.
+    """
+    fields_by_table = _FIELDS_CACHE.setdefault(vdb, {})
+    fields = fields_by_table.get(table)
+    if fields is None:
+        fields = fields_by_table[table] = list(vdb.get_fields(table))
+    return fields
+
+
+def _is_comparative_dataset(vdb: VirtualDB, repo_id: str, config_name: str) -> bool:
+    """Return whether a dataset is comparative, cached per VirtualDB instance."""
+    flags = _COMPARATIVE_CACHE.setdefault(vdb, {})
+    key = (repo_id, config_name)
+    flag = flags.get(key)
+    if flag is None:
+        flag = flags[key] = bool(vdb._is_comparative(repo_id, config_name))
+    return flag
+
+
+def _cached_source_summary(vdb: VirtualDB, db_name: str) -> SourceSummaryEntry | None:
+    """Return a still-fresh source summary for ``db_name``, if one was stored."""
+    with _source_summary_lock:
+        summaries = _SOURCE_SUMMARY_CACHE.get(vdb)
+        return summaries.get(db_name) if summaries is not None else None
+
+
+def _store_source_summary(vdb: VirtualDB, entry: SourceSummaryEntry) -> None:
+    """Cache a source summary for this VirtualDB instance."""
+    with _source_summary_lock:
+        summaries = _SOURCE_SUMMARY_CACHE.get(vdb)
+        if summaries is None:
+            summaries = _SOURCE_SUMMARY_CACHE[vdb] = TTLCache(
+                maxsize=256, ttl=_SOURCE_SUMMARY_TTL_SECONDS
+            )
+        summaries[entry.db_name] = entry
+
+
+def _cached_table_stat(vdb: VirtualDB, key: tuple[str, ...]) -> object | None:
+    """Return a still-fresh table statistic such as a row count, if stored."""
+    with _table_stats_lock:
+        stats = _TABLE_STATS_CACHE.get(vdb)
+        return stats.get(key) if stats is not None else None
+
+
+def _store_table_stat(vdb: VirtualDB, key: tuple[str, ...], value: object) -> None:
+    """Cache a table statistic for this VirtualDB instance.
+
+    Statistics expire on the source-summary schedule, for the same reason.
+    """
+    with _table_stats_lock:
+        stats = _TABLE_STATS_CACHE.get(vdb)
+        if stats is None:
+            stats = _TABLE_STATS_CACHE[vdb] = TTLCache(
+                maxsize=512, ttl=_SOURCE_SUMMARY_TTL_SECONDS
+            )
+        stats[key] = value
+
+
+def _cached_distinct_values(vdb: VirtualDB, table: str, field: str) -> list | None:
+    """Return the still-fresh distinct values of ``table.field``, if stored."""
+    with _distinct_values_lock:
+        values = _DISTINCT_VALUES_CACHE.get(vdb)
+        return values.get((table, field)) if values is not None else None
+
+
+def _store_distinct_values(
+    vdb: VirtualDB, table: str, field: str, distinct: list
+) -> None:
+    """Cache the distinct values of ``table.field`` for this VirtualDB instance."""
+    with _distinct_values_lock:
+        values = _DISTINCT_VALUES_CACHE.get(vdb)
+        if values is None:
+            values = _DISTINCT_VALUES_CACHE[vdb] = TTLCache(
+                maxsize=512, ttl=_DISTINCT_VALUES_TTL_SECONDS
+            )
+        values[(table, field)] = distinct
+
+
+def _common_fields(vdb: VirtualDB) -> list[str]:
+    """Return fields shared by all primary _meta views, cached per VirtualDB."""
+    fields = _COMMON_FIELDS_CACHE.get(vdb)
+    if fields is None:
+        fields = _COMMON_FIELDS_CACHE[vdb] = list(vdb.get_common_fields())
+    return fields
 
 
 def _column_type_map(vdb: VirtualDB, table: str) -> dict[str, str]:
-    """Return map of column name -> DuckDB type for a table."""
+    """Return map of column name -> DuckDB type for a table.
+
+    Results are cached per VirtualDB instance, since view schemas do not change
+    until the instance is rebuilt. Callers must not mutate the returned dict.
+    """
+    schemas = _SCHEMA_CACHE.setdefault(vdb, {})
+    type_map = schemas.get(table)
+    if type_map is None:
+        type_map = schemas[table] = _describe_column_types(vdb, table)
+    return type_map
+
+
+def _describe_column_types(vdb: VirtualDB, table: str) -> dict[str, str]:
+    """Run DESCRIBE for a table and map column name -> DuckDB type."""
     describe_df = vdb.describe(table)
     if describe_df.empty:
         return {}
@@ -104,35 +302,81 @@ def _column_type_map(vdb: VirtualDB, table: str) -> dict[str, str]:
     if "column_name" not in describe_df or "column_type" not in describe_df:
         return {}
 
-    return {
-        str(row["column_name"]): str(row["column_type"])
-        for _, row in describe_df.iterrows()
-    }
-
-
-def _build_where_sql(body: IntersectionRequest, dataset_name: str) -> str:
-    """Build SQL WHERE clause for categorical + numeric filters."""
+    names = describe_df["column_name"].to_numpy()
+    types = describe_df["column_type"].to_numpy()
+    return {str(name): str(column_type) for name, column_type in zip(names, types)}
+
+
+@lru_cache(maxsize=1024)
+def _in_filter_template(
+    dataset_name: str, field: str, count: int
+) -> tuple[str, tuple[str, ...]]:
+    """Return the ``field IN (...)`` clause and parameter names for ``count`` values.
+
+    Filter shapes repeat across requests even when the values differ, so the
+    clause text is built once per (dataset, field, count).
+    """
+    names = tuple(f"{dataset_name}__{field}_{index}" for index in range(count))
+    placeholders = ", ".join(f"${name}" for name in names)
+    return f"{field} IN ({placeholders})", names
+
+
+@lru_cache(maxsize=1024)
+def _range_filter_template(dataset_name: str, field: str) -> tuple[str, str, str, str]:
+    """Return ``(min_name, min_clause, max_name, max_clause)`` for a numeric filter."""
+    min_name = f"{dataset_name}__{field}_min"
+    max_name = f"{dataset_name}__{field}_max"
+    return min_name, f"{field} >= ${min_name}", max_name, f"{field} <= ${max_name}"
+
+
+def _build_where_sql(
+    body: IntersectionRequest,
+    dataset_name: str,
+    column_types: dict[str, str] | None = None,
+) -> tuple[str, dict[str, object]]:
+    """Build SQL WHERE clause for categorical + numeric filters.
+
+    Filter values are bound as named parameters rather than interpolated, so the
+    returned params must be passed through to ``vdb.query(sql, **params)``.
+    When ``column_types`` marks a numeric filter column as an integer type, its
+    bounds are bound as (inclusive-equivalent) integers so DuckDB compares the
+    column natively instead of casting every row to DOUBLE.
+    """
     where_clauses: list[str] = []
+    params: dict[str, object] = {}
 
     categorical_filters = body.filters.get(dataset_name, {})
     for field, values in categorical_filters.items():
         field = _validate_identifier(field)
-        escaped = [str(v).replace("'", "''") for v in values if str(v) != ""]
-        if not escaped:
+        kept = [str(v) for v in values if str(v) != ""]
+        if not kept:
             continue
-        value_list = ", ".join(f"'{v}'" for v in escaped)
-        where_clauses.append(f"{field} IN ({value_list})")
+        clause, names = _in_filter_template(dataset_name, field, len(kept))
+        params.update(zip(names, kept))
+        where_clauses.append(clause)
 
     numeric_filters = body.numeric_filters.get(dataset_name, {})
     for field, numeric_filter in numeric_filters.items():
         field = _validate_identifier(field)
         min_value = numeric_filter.min_value
         max_value = numeric_filter.max_value
+        for bound in (min_value, max_value):
+            if bound is not None and not math.isfinite(bound):
+                raise ValueError(
+                    f"Invalid numeric filter for '{dataset_name}.{field}': "
+                    f"bounds must be finite, got {bound}"
+                )
+        integral = _is_integer_column_type((column_types or {}).get(field))
+        min_name, min_clause, max_name, max_clause = _range_filter_template(
+            dataset_name, field
+        )
 
         if min_value is not None:
-            where_clauses.append(f"{field} >= {float(min_value)}")
+            params[min_name] = math.ceil(min_value) if integral else float(min_value)
+            where_clauses.append(min_clause)
         if max_value is not None:
-            where_clauses.append(f"{field} <= {float(max_value)}")
+            params[max_name] = math.floor(max_value) if integral else float(max_value)
+            where_clauses.append(max_clause)
         if (
             min_value is not None
             and max_value is not None
@@ -143,24 +387,13 @@ def _build_where_sql(body: IntersectionRequest, dataset_name: str) -> str:
                 f"min_value {min_value} is greater than max_value {max_value}"
             )
 
-    return f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    where_sql = f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    return where_sql, params
 
 
-def _candidate_regulator_tables(dataset_name: str) -> list[str]:
-    """Build ordered list of metadata tables to search for regulator identifiers."""
-    candidates: list[str] = [f"{dataset_name}_meta"]
-    item = DATASET_CATALOG_BY_DB_NAME.get(dataset_name)
-    if not item:
-        return candidates
-
-    for supplemental in item.supplemental_configs:
-        candidates.extend(
-            [
-                f"{supplemental.db_name}_meta",
-                supplemental.db_name,
-            ]
-        )
-    return candidates
+def _candidate_regulator_tables(dataset_name: str) -> tuple[str, ...]:
+    """Return ordered metadata tables to search for regulator identifiers."""
+    return REGULATOR_TABLE_CANDIDATES.get(dataset_name) or (f"{dataset_name}_meta",)
 
 
 def _normalize_numeric_stat(value: object) -> float | None:
@@ -171,4 +404,240 @@ def _normalize_numeric_stat(value: object) -> float | None:
         numeric = float(value)
     except (TypeError, ValueError):
         return None
-    return None if math.isnan(numeric) else numeric
+    # NaN is the only float that compares unequal to itself.
+    return None if numeric != numeric else numeric
+
+
+def _filter_options_for_table(vdb: VirtualDB, table: str) -> list[FilterOption]:
+    """Return numeric ranges and small categorical value sets for a table's fields.
+
+    Uses one aggregate scan plus batched distinct-values queries, and caches
+    the result with the other table statistics. Callers must not mutate the
+    returned list.
+    """
+    key = ("filter_options", table)
+    options = _cached_table_stat(vdb, key)
+    if options is None:
+        options = _summarize_filter_options(vdb, table)
+        _store_table_stat(vdb, key, options)
+    return options
+
+
+def _summarize_filter_options(vdb: VirtualDB, table: str) -> list[FilterOption]:
+    """Build filter options for a table from one MIN/MAX/approx-distinct scan.
+
+    Numeric fields get their range and other fields an approximate distinct
+    count, all in a single SELECT; SUMMARIZE computes far more per column.
+    """
+    type_map = _column_type_map(vdb, table)
+    filter_fields = [
+        field
+        for field in _table_fields(vdb, table)
+        if field not in _SUMMARY_EXCLUDED_FIELDS
+    ]
+    if not filter_fields:
+        return []
+    numeric = {
+        field for field in filter_fields if _is_numeric_column_type(type_map.get(field))
+    }
+    aggregates = ", ".join(
+        (
+            f"MIN({field}) AS min_{field}, MAX({field}) AS max_{field}"
+            if field in numeric
+            else f"approx_count_distinct({field}) AS approx_{field}"
+        )
+        for field in filter_fields
+    )
+    summary = vdb.query(f"SELECT {aggregates} FROM {table}").iloc[0]
+    categorical_fields = [
+        field
+        for field in filter_fields
+        if field not in numeric
+        # approx_count_distinct is a HyperLogLog estimate; leave headroom for its
+        # error and let the capped values query apply the exact limit.
+        and 0 < summary[f"approx_{field}"] <= 2 * _MAX_CATEGORICAL_VALUES
+    ]
+    categorical_values = _distinct_values_by_field(vdb, table, categorical_fields)
+
+    options: list[FilterOption] = []
+    for field in filter_fields:
+        if field in numeric:
+            min_value = _normalize_numeric_stat(summary[f"min_{field}"])
+            max_value = _normalize_numeric_stat(summary[f"max_{field}"])
+            if min_value is None and max_value is None:
+                continue
+            options.append(
+                FilterOption(
+                    field=field,
+                    kind="numeric",
+                    min_value=min_value,
+                    max_value=max_value,
+                )
+            )
+        elif categorical_values.get(field):
+            options.append(
+                FilterOption(
+                    field=field,
+                    kind="categorical",
+                    values=categorical_values[field],
+                )
+            )
+    return options
+
+
+def _numeric_ranges(
+    vdb: VirtualDB, table: str, fields: list[str]
+) -> dict[str, tuple[float | None, float | None]]:
+    """Fetch the MIN/MAX of several numeric columns in a single table scan."""
+    if not fields:
+        return {}
+    aggregates = ", ".join(
+        f"MIN({field}) AS min_{field}, MAX({field}) AS max_{field}" for field in fields
+    )
+    row = vdb.query(f"SELECT {aggregates} FROM {table}").iloc[0]
+    return {
+        field: (
+            _normalize_numeric_stat(row[f"min_{field}"]),
+            _normalize_numeric_stat(row[f"max_{field}"]),
+        )
+        for field in fields
+    }
+
+
+def _fields_by_column_type(
+    vdb: VirtualDB, table: str, fields: list[str]
+) -> list[list[str]]:
+    """Group fields that share a DuckDB column type, so they union without casts.
+
+    Fields missing from the table schema are each put in a group of their own.
+    """
+    type_map = _column_type_map(vdb, table)
+    groups: dict[object, list[str]] = {}
+    for field in fields:
+        groups.setdefault(type_map.get(field) or (field,), []).append(field)
+    return list(groups.values())
+
+
+def _distinct_values_by_field(
+    vdb: VirtualDB,
+    table: str,
+    fields: list[str],
+    limit: int | None = _MAX_CATEGORICAL_VALUES,
+) -> dict[str, list[str]]:
+    """Fetch the sorted distinct non-null values of several columns.
+
+    Columns of the same type share one query. Values come back typed and are
+    stringified with ``str()``, so e.g. booleans read ``True`` and dates
+    ``2024-01-02 00:00:00`` exactly as a single-column ``SELECT DISTINCT`` would.
+    With a ``limit``, each column stops scanning after one value more than it;
+    columns that reach it are left out of the result.
+    """
+    limit_sql = f" LIMIT {limit + 1}" if limit is not None else ""
+    values: dict[str, list[str]] = {}
+    for group in _fields_by_column_type(vdb, table, fields):
+        branches = [
+            f"SELECT '{field}' AS field_name, {field} AS value, "
+            f"row_number() OVER (ORDER BY {field}) AS ord "
+            f"FROM (SELECT DISTINCT {field} FROM {table} WHERE {field} IS NOT NULL"
+            f"{limit_sql})"
+            for field in group
+        ]
+        values_df = vdb.query(
+            " UNION ALL ".join(branches) + " ORDER BY field_name, ord"
+        )
+        for field, value in zip(
+            values_df["field_name"].tolist(), values_df["value"].tolist()
+        ):
+            values.setdefault(field, []).append(str(value))
+    if limit is None:
+        return values
+    return {
+        field: field_values
+        for field, field_values in values.items()
+        if len(field_values) <= limit
+    }
+
+
+def _df_to_records(df: pd.DataFrame) -> list[dict]:
+    """Convert a DataFrame to a list of row dicts.
+
+    Equivalent to ``df.to_dict(orient="records")`` but converts column-wise, so
+    values are boxed by each column's ``tolist`` rather than cell by cell. Rows
+    are filled into copies of a prototype dict, so each starts at its final size.
+    """
+    names = list(df.columns)
+    columns = [
+        (
+            [None if value is pd.NA else value for value in series.tolist()]
+            if isinstance(series.dtype, pd.api.extensions.ExtensionDtype)
+            and series.hasnans
+            else series.tolist()
+        )
+        for _, series in df.items()
+    ]
+    prototype = dict.fromkeys(names)
+    records: list[dict] = []
+    for row in zip(*columns):
+        record = prototype.copy()
+        record.update(zip(names, row))
+        records.append(record)
+    return records
+
+
+def _encode_cursor(last_key: object, skip: int) -> str:
+    """Encode the position after a keyset page as an opaque, URL-safe cursor.
+
+    ``skip`` counts the rows already returned whose key equals ``last_key``. NaN
+    is flagged separately because JSON has no representation for it.
+    """
+    if isinstance(last_key, float) and math.isnan(last_key):
+        state: dict[str, object] = {"nan": True, "skip": skip}
+    else:
+        state = {"last": last_key, "skip": skip}
+    payload = orjson.dumps(state, default=_json_default)
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[object, int]:
+    """Return the last key and tie count stored by ``_encode_cursor``."""
+    try:
+        state = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        last_key = math.nan if state.get("nan") else state["last"]
+        skip = state["skip"]
+    except (
+        binascii.Error,
+        UnicodeEncodeError,
+        orjson.JSONDecodeError,
+        AttributeError,
+        KeyError,
+        TypeError,
+    ):
+        raise ValueError(f"Invalid cursor: {cursor!r}") from None
+    if type(skip) is not int or skip < 0:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return last_key, skip
+
+
+def _arrow_ipc_stream(
+    df: pd.DataFrame, batch_rows: int = _ARROW_BATCH_ROWS
+) -> Iterator[bytes]:
+    """Serialize a DataFrame as an Arrow IPC stream, yielding one chunk per batch.
+
+    Requires the optional ``pyarrow`` dependency.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+
+    def drain() -> bytes:
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            yield drain()
+    yield drain()
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
-from functools import lru_cache
+import asyncio
+import contextlib
+import os
+import shutil
+import tempfile
 import threading
 from pathlib import Path
 
 import yaml
+from cachetools import TTLCache, cached
 from fastapi import APIRouter, Depends, Request
 from tfbpapi import VirtualDB
 from tfbpapi.fetchers import HfDataCardFetcher, HfSizeInfoFetcher
@@ -13,10 +18,13 @@ from app.config import Settings, get_settings
 from app.dataset_catalog import (
     DATASET_CATALOG,
     DATASET_CATALOG_BY_ID,
+    DATASET_CATALOG_BY_PAIR,
+    MANAGED_CONFIGS_BY_REPO,
     MANAGED_DATASET_KEYS,
     DatasetCatalogItem,
 )
-from app.dependencies import get_vdb, get_vdb_lock
+from app.dependencies import get_vdb
+from app.routers._query_utils import _invalidate_schema_cache
 from app.schemas import (
     ActiveSetConfigSyncRequest,
     ActiveSetConfigSyncResponse,
@@ -24,10 +32,28 @@ from app.schemas import (
     SupplementalCatalogEntry,
 )
 
+try:
+    from yaml import CSafeDumper as _YamlDumper, CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeDumper as _YamlDumper, SafeLoader as _YamlLoader  # type: ignore[assignment]
+
 router = APIRouter(tags=["active-set-config"])
 
+# Serializes config syncs: each is a read-modify-write of the YAML file followed by
+# a VirtualDB rebuild. Readers never take it.
+_sync_lock = asyncio.Lock()
+
+# HF metadata changes rarely but does change; expire entries so the catalog picks up
+# datacard edits without a restart.
+_HF_METADATA_TTL_SECONDS = 15 * 60
+_datacard_raw_cache = TTLCache(maxsize=64, ttl=_HF_METADATA_TTL_SECONDS)
+_size_raw_cache = TTLCache(maxsize=64, ttl=_HF_METADATA_TTL_SECONDS)
+_config_columns_cache = TTLCache(maxsize=64, ttl=_HF_METADATA_TTL_SECONDS)
+_config_size_map_cache = TTLCache(maxsize=64, ttl=_HF_METADATA_TTL_SECONDS)
+_hf_metadata_lock = threading.RLock()
+
 
-@lru_cache(maxsize=64)
+@cached(cache=_datacard_raw_cache, lock=_hf_metadata_lock)
 def _cached_datacard_raw(repo_id: str, token: str | None) -> dict:
     try:
         return HfDataCardFetcher(token=token).fetch(repo_id)
@@ -35,7 +61,7 @@ def _cached_datacard_raw(repo_id: str, token: str | None) -> dict:
         return {}
 
 
-@lru_cache(maxsize=64)
+@cached(cache=_size_raw_cache, lock=_hf_metadata_lock)
 def _cached_size_raw(repo_id: str, token: str | None) -> dict:
     try:
         return HfSizeInfoFetcher(token=token).fetch(repo_id)
@@ -43,7 +69,7 @@ def _cached_size_raw(repo_id: str, token: str | None) -> dict:
         return {}
 
 
-@lru_cache(maxsize=64)
+@cached(cache=_config_columns_cache, lock=_hf_metadata_lock)
 def _config_columns(repo_id: str, token: str | None) -> dict[str, list[str]]:
     raw = _cached_datacard_raw(repo_id, token)
     configs = raw.get("configs", []) if isinstance(raw, dict) else []
@@ -71,7 +97,7 @@ def _config_columns(repo_id: str, token: str | None) -> dict[str, list[str]]:
     return by_config
 
 
-@lru_cache(maxsize=64)
+@cached(cache=_config_size_map_cache, lock=_hf_metadata_lock)
 def _config_size_map(repo_id: str, token: str | None) -> dict[str, tuple[int | None, int | None]]:
     raw = _cached_size_raw(repo_id, token)
     if not isinstance(raw, dict):
@@ -98,12 +124,41 @@ def _config_size_map(repo_id: str, token: str | None) -> dict[str, tuple[int | N
     return by_config
 
 
+_CATALOG_REPO_IDS = tuple(dict.fromkeys(item.repo_id for item in DATASET_CATALOG))
+
+
+async def _prefetch_hf_metadata(
+    token: str | None,
+) -> tuple[
+    dict[str, dict[str, list[str]]],
+    dict[str, dict[str, tuple[int | None, int | None]]],
+]:
+    """Fetch per-repo column and size maps for every catalog repository concurrently.
+
+    Returns ``(columns_by_repo, sizes_by_repo)``; also warms the TTL caches.
+    """
+    columns, sizes = await asyncio.gather(
+        asyncio.gather(
+            *(
+                asyncio.to_thread(_config_columns, repo_id, token)
+                for repo_id in _CATALOG_REPO_IDS
+            )
+        ),
+        asyncio.gather(
+            *(
+                asyncio.to_thread(_config_size_map, repo_id, token)
+                for repo_id in _CATALOG_REPO_IDS
+            )
+        ),
+    )
+    return dict(zip(_CATALOG_REPO_IDS, columns)), dict(zip(_CATALOG_REPO_IDS, sizes))
+
+
 def _active_catalog_ids(vdb: VirtualDB) -> set[str]:
-    active_pairs = set(vdb._db_name_map.values())
     return {
         item.id
-        for item in DATASET_CATALOG
-        if (item.repo_id, item.config_name) in active_pairs
+        for pair in vdb._db_name_map.values()
+        if (item := DATASET_CATALOG_BY_PAIR.get(pair)) is not None
     }
 
 
@@ -112,7 +167,7 @@ def _load_metadata_config(path: Path) -> dict:
         return {"repositories": {}}
 
     with path.open("r", encoding="utf-8") as handle:
-        payload = yaml.safe_load(handle) or {}
+        payload = yaml.load(handle, Loader=_YamlLoader) or {}
 
     if not isinstance(payload, dict):
         raise ValueError("VirtualDB config file must contain a YAML dictionary")
@@ -128,7 +183,8 @@ def _load_metadata_config(path: Path) -> dict:
 
 def _prune_managed_dataset_entries(payload: dict) -> None:
     repositories = payload.setdefault("repositories", {})
-    for repo_id in list(repositories.keys()):
+    # Only repositories that own catalog-managed configs can need pruning.
+    for repo_id in MANAGED_CONFIGS_BY_REPO.keys() & repositories.keys():
         repo_cfg = repositories[repo_id]
         if not isinstance(repo_cfg, dict):
             continue
@@ -137,9 +193,9 @@ def _prune_managed_dataset_entries(payload: dict) -> None:
         if not isinstance(dataset_cfg, dict):
             continue
 
-        for config_name in list(dataset_cfg.keys()):
-            if (repo_id, config_name) in MANAGED_DATASET_KEYS:
-                del dataset_cfg[config_name]
+        managed_configs = MANAGED_CONFIGS_BY_REPO[repo_id]
+        for config_name in managed_configs & dataset_cfg.keys():
+            del dataset_cfg[config_name]
 
         if not dataset_cfg:
             repo_cfg.pop("dataset", None)
@@ -174,23 +230,70 @@ def _append_selected_datasets(payload: dict, selected: list[DatasetCatalogItem])
             )
 
 
+def _selected_dataset_keys(selected: list[DatasetCatalogItem]) -> set[tuple[str, str]]:
+    keys: set[tuple[str, str]] = set()
+    for item in selected:
+        keys.add((item.repo_id, item.config_name))
+        keys.update(
+            (item.repo_id, supplemental.config_name)
+            for supplemental in item.supplemental_configs
+        )
+    return keys
+
+
+def _loaded_managed_keys(vdb: VirtualDB) -> set[tuple[str, str]]:
+    return {pair for pair in vdb._db_name_map.values() if pair in MANAGED_DATASET_KEYS}
+
+
+def _rewrite_metadata_config(path: Path, selected: list[DatasetCatalogItem]) -> None:
+    payload = _load_metadata_config(path)
+    _prune_managed_dataset_entries(payload)
+    _append_selected_datasets(payload, selected)
+    _write_metadata_config(path, payload)
+
+
 def _write_metadata_config(path: Path, payload: dict) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        yaml.safe_dump(payload, handle, sort_keys=False)
+    # Replace the file a symlinked config points at, not the link itself.
+    target = path.resolve()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    text = yaml.dump(payload, Dumper=_YamlDumper, sort_keys=False)
+    # Write a uniquely named sibling temp file and rename it over the target, so
+    # readers never see a partially written config.
+    handle = tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=target.parent,
+        prefix=f".{target.name}.",
+        suffix=".tmp",
+        delete=False,
+    )
+    try:
+        with handle:
+            handle.write(text)
+            handle.flush()
+            os.fsync(handle.fileno())
+        with contextlib.suppress(FileNotFoundError):
+            shutil.copymode(target, handle.name)
+        os.replace(handle.name, target)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(handle.name)
+        raise
 
 
 @router.get("/dataset-catalog", response_model=list[DatasetCatalogEntry])
-def dataset_catalog(
+async def dataset_catalog(
     vdb: VirtualDB = Depends(get_vdb),
     settings: Settings = Depends(get_settings),
 ) -> list[DatasetCatalogEntry]:
+    # Overlap the (cold-cache) HF round-trips and resolve each repo's maps once.
+    columns_by_repo, sizes_by_repo = await _prefetch_hf_metadata(settings.hf_token)
     active_ids = _active_catalog_ids(vdb)
 
     result: list[DatasetCatalogEntry] = []
     for item in DATASET_CATALOG:
-        columns_by_config = _config_columns(item.repo_id, settings.hf_token)
-        size_by_config = _config_size_map(item.repo_id, settings.hf_token)
+        columns_by_config = columns_by_repo[item.repo_id]
+        size_by_config = sizes_by_repo[item.repo_id]
         columns = columns_by_config.get(item.config_name, [])
         estimated_rows, num_columns = size_by_config.get(item.config_name, (None, None))
         supplemental_entries: list[SupplementalCatalogEntry] = []
@@ -237,11 +340,10 @@ def dataset_catalog(
 
 
 @router.post("/active-set/sync-config", response_model=ActiveSetConfigSyncResponse)
-def sync_active_set_config(
+async def sync_active_set_config(
     body: ActiveSetConfigSyncRequest,
     request: Request,
     settings: Settings = Depends(get_settings),
-    lock: threading.Lock = Depends(get_vdb_lock),
 ) -> ActiveSetConfigSyncResponse:
     selected_items: list[DatasetCatalogItem] = []
     seen: set[str] = set()
@@ -263,13 +365,21 @@ def sync_active_set_config(
 
     config_path = Path(settings.config_path)
 
-    payload = _load_metadata_config(config_path)
-    _prune_managed_dataset_entries(payload)
-    _append_selected_datasets(payload, selected_items)
-    _write_metadata_config(config_path, payload)
+    async with _sync_lock:
+        await asyncio.to_thread(_rewrite_metadata_config, config_path, selected_items)
 
-    with lock:
-        request.app.state.vdb = VirtualDB(settings.config_path, token=settings.hf_token)
+        # Rebuilding VirtualDB re-registers every dataset, so skip it when the loaded
+        # instance already serves exactly the requested managed datasets.
+        if _selected_dataset_keys(selected_items) != _loaded_managed_keys(
+            request.app.state.vdb
+        ):
+            vdb = await asyncio.to_thread(
+                VirtualDB, settings.config_path, token=settings.hf_token
+            )
+            # Requests that already resolved the previous instance finish against it;
+            # the reference swap itself is atomic, so readers are never blocked.
+            request.app.state.vdb = vdb
+            _invalidate_schema_cache()
 
     active_ids = [item.id for item in selected_items]
 
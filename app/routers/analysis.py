@@ -2,27 +2,44 @@
 
 from __future__ import annotations
 
+import re
 import threading
+from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from tfbpapi import VirtualDB
 
 from app.dependencies import get_vdb, get_vdb_lock
+from app.responses import RecordsJSONResponse
 from app.routers._query_utils import (
+    _SAMPLE_IDENTIFIER_CANDIDATES,
+    ARROW_STREAM_MEDIA_TYPE,
+    _arrow_ipc_stream,
     _build_where_sql,
+    _cached_source_summary,
+    _cached_table_stat,
     _column_type_map,
-    _is_numeric_column_type,
-    _normalize_numeric_stat,
+    _df_to_records,
+    _filter_options_for_table,
+    _first_present,
+    _in_filter_template,
     _resolve_regulator_identifier,
     _resolve_sample_identifier,
+    _store_source_summary,
+    _store_table_stat,
+    _table_fields,
+    _table_set,
     _validate_identifier,
 )
 from app.schemas import (
     AnalysisDataResponse,
     AnalysisRequest,
+    CorrelationCell,
     CorrelationMatrixResponse,
     CorrelationRequest,
-    FilterOption,
     FilterOptionsRequest,
     FilterOptionsResponse,
     SourceSummaryEntry,
@@ -30,6 +47,131 @@ from app.schemas import (
 
 router = APIRouter(tags=["analysis"])
 
+_TARGET_COLUMN_CANDIDATES = ("target_locus_tag", "target", "gene_locus_tag")
+_BINDING_KEYWORDS = re.compile(r"binding|chip|calling_cards|occupancy|chec|chip-exo")
+_PERTURBATION_KEYWORDS = re.compile(
+    r"perturb|expression|rna|knockout|deletion|overexpression|comparative|degron"
+)
+
+
+def _fetch_analysis_page(
+    vdb: VirtualDB, lock: threading.Lock, body: AnalysisRequest, ds_name: str
+) -> tuple[pd.DataFrame, int, list[str]]:
+    """Fetch one filtered page of a dataset with its total row count and columns.
+
+    The total comes from a separate COUNT(*), which DuckDB answers without
+    materializing the filtered rows; the page query is skipped when it is zero.
+    With ``use_exact_count`` off, pages after the first reuse a cached total.
+    The lock is held only for the DuckDB calls.
+    """
+    with lock:
+        # Verify table exists
+        if ds_name not in _table_set(vdb):
+            raise HTTPException(
+                status_code=400, detail=f"Dataset '{ds_name}' not found"
+            )
+
+        # Build WHERE clause from filters
+        where_sql, where_params = _build_where_sql(
+            body, ds_name, _column_type_map(vdb, ds_name)
+        )
+
+        # Project only the requested columns that exist in this dataset
+        fields = _table_fields(vdb, ds_name)
+        columns = fields
+        if body.columns:
+            requested = [_validate_identifier(c) for c in body.columns]
+            columns = [c for c in requested if c in fields] or fields
+        select_sql = "*" if columns is fields else ", ".join(columns)
+
+        total_key = ("total", ds_name, where_sql, repr(sorted(where_params.items())))
+        total = None
+        if not body.use_exact_count and body.page > 1:
+            total = _cached_table_stat(vdb, total_key)
+        if total is None:
+            count_sql = f"SELECT COUNT(*) AS total FROM {ds_name}{where_sql}"
+            total_df = vdb.query(count_sql, **where_params)
+            total = int(total_df["total"].iloc[0])
+            _store_table_stat(vdb, total_key, total)
+        if total == 0:
+            return pd.DataFrame(columns=columns), 0, columns
+
+        offset = (body.page - 1) * body.page_size
+        data_sql = (
+            f"SELECT {select_sql} FROM {ds_name}{where_sql} "
+            "LIMIT $page_limit OFFSET $page_offset"
+        )
+        data_df = vdb.query(
+            data_sql, **where_params, page_limit=body.page_size, page_offset=offset
+        )
+
+    return data_df, total, columns
+
+
+def _query_analysis_page(
+    vdb: VirtualDB, lock: threading.Lock, body: AnalysisRequest, ds_name: str
+) -> dict[str, Any]:
+    """Fetch one filtered page of a dataset as an ``AnalysisDataResponse`` payload."""
+    data_df, total, columns = _fetch_analysis_page(vdb, lock, body, ds_name)
+    return {
+        "db_name": ds_name,
+        "data": _df_to_records(data_df),
+        "total": total,
+        "page": body.page,
+        "page_size": body.page_size,
+        "has_next": body.page * body.page_size < total,
+        "columns": columns,
+    }
+
+
+def _analysis_arrow_response(
+    vdb: VirtualDB, lock: threading.Lock, body: AnalysisRequest, ds_name: str
+) -> StreamingResponse:
+    """Stream one page of a dataset as Arrow IPC record batches.
+
+    Pagination metadata travels in ``X-Total-Count``/``X-Has-Next`` headers.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(
+            status_code=406, detail="Arrow responses require pyarrow to be installed"
+        )
+
+    data_df, total, _ = _fetch_analysis_page(vdb, lock, body, ds_name)
+    return StreamingResponse(
+        _arrow_ipc_stream(data_df),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={
+            "X-Db-Name": ds_name,
+            "X-Total-Count": str(total),
+            "X-Has-Next": str(body.page * body.page_size < total).lower(),
+        },
+    )
+
+
+def _run_analysis(
+    vdb: VirtualDB,
+    lock: threading.Lock,
+    body: AnalysisRequest,
+    accept: str | None,
+) -> Response:
+    """Serve an analysis request as JSON pages, or as an Arrow stream if accepted."""
+    dataset_names = [_validate_identifier(d) for d in body.datasets]
+    if accept and ARROW_STREAM_MEDIA_TYPE in accept:
+        if len(dataset_names) != 1:
+            raise HTTPException(
+                status_code=400,
+                detail="Arrow responses support exactly one dataset per request",
+            )
+        return _analysis_arrow_response(vdb, lock, body, dataset_names[0])
+
+    # The payload is built field-for-field from AnalysisDataResponse, so returning
+    # the response directly skips re-validating every record.
+    return RecordsJSONResponse(
+        [_query_analysis_page(vdb, lock, body, ds_name) for ds_name in dataset_names]
+    )
+
 
 @router.get("/analysis/source-summary/{db_name}", response_model=SourceSummaryEntry)
 def source_summary(
@@ -39,11 +181,15 @@ def source_summary(
 ) -> SourceSummaryEntry:
     """Get summary statistics for a single dataset."""
     db_name = _validate_identifier(db_name)
+    cached = _cached_source_summary(vdb, db_name)
+    if cached is not None:
+        return cached
+
     meta_table = f"{db_name}_meta"
 
     with lock:
         # Verify tables exist
-        tables = vdb.tables()
+        tables = _table_set(vdb)
         if db_name not in tables:
             raise HTTPException(status_code=400, detail=f"Dataset '{db_name}' not found")
         if meta_table not in tables:
@@ -51,131 +197,69 @@ def source_summary(
                 status_code=400, detail=f"Metadata table '{meta_table}' not found"
             )
 
-        # Get basic counts
-        total_rows_df = vdb.query(f"SELECT COUNT(*) AS cnt FROM {db_name}")
-        total_rows = int(total_rows_df["cnt"].iloc[0])
-
-        # Get column count
-        fields = vdb.get_fields(db_name)
+        fields = _table_fields(vdb, db_name)
         column_count = len(fields)
-
-        # Get regulator count
-        meta_fields = vdb.get_fields(meta_table)
+        meta_fields = _table_fields(vdb, meta_table)
+
+        # Collect every scalar count in a single query, grouping the aggregates
+        # per table so each table is scanned once.
+        data_aggregates = ["COUNT(*) AS total_rows"]
+        target_field = next((c for c in _TARGET_COLUMN_CANDIDATES if c in fields), None)
+        if target_field is not None:
+            data_aggregates.append(f"COUNT(DISTINCT {target_field}) AS target_count")
+        meta_aggregates: list[str] = []
         try:
             regulator_field = _resolve_regulator_identifier(meta_fields, meta_table)
-            regulator_count_df = vdb.query(
-                f"SELECT COUNT(DISTINCT {regulator_field}) AS cnt FROM {meta_table}"
+            meta_aggregates.append(
+                f"COUNT(DISTINCT {regulator_field}) AS regulator_count"
             )
-            regulator_count = int(regulator_count_df["cnt"].iloc[0])
         except ValueError:
-            regulator_count = 0
-
-        # Get target count (if target_locus_tag or similar exists)
-        target_count = 0
-        target_candidates = ["target_locus_tag", "target", "gene_locus_tag"]
-        for candidate in target_candidates:
-            if candidate in fields:
-                target_count_df = vdb.query(
-                    f"SELECT COUNT(DISTINCT {candidate}) AS cnt FROM {db_name}"
-                )
-                target_count = int(target_count_df["cnt"].iloc[0])
-                break
-
-        # Get sample count
+            pass
         try:
             sample_field = _resolve_sample_identifier(meta_fields, meta_table)
-            sample_count_df = vdb.query(
-                f"SELECT COUNT(DISTINCT {sample_field}) AS cnt FROM {meta_table}"
-            )
-            sample_count = int(sample_count_df["cnt"].iloc[0])
+            meta_aggregates.append(f"COUNT(DISTINCT {sample_field}) AS sample_count")
         except ValueError:
-            sample_count = 0
+            pass
+        counts_sql = (
+            f"SELECT * FROM (SELECT {', '.join(data_aggregates)} FROM {db_name})"
+        )
+        if meta_aggregates:
+            counts_sql += (
+                f" CROSS JOIN (SELECT {', '.join(meta_aggregates)} FROM {meta_table})"
+            )
+        counts = vdb.query(counts_sql).iloc[0]
+        total_rows = int(counts["total_rows"])
+        regulator_count = int(counts.get("regulator_count", 0))
+        target_count = int(counts.get("target_count", 0))
+        sample_count = int(counts.get("sample_count", 0))
 
         # Get metadata field info (for filter UI)
-        type_map = _column_type_map(vdb, meta_table)
-        metadata_fields: list[FilterOption] = []
-        for field in meta_fields:
-            if field in ("sample_id", "sra_accession"):
-                continue
-            if _is_numeric_column_type(type_map.get(field)):
-                range_df = vdb.query(
-                    f"SELECT MIN({field}) AS min_value, MAX({field}) AS max_value "
-                    f"FROM {meta_table} WHERE {field} IS NOT NULL"
-                )
-                min_value = _normalize_numeric_stat(range_df["min_value"].iloc[0])
-                max_value = _normalize_numeric_stat(range_df["max_value"].iloc[0])
-                if min_value is None and max_value is None:
-                    continue
-                metadata_fields.append(
-                    FilterOption(
-                        field=field,
-                        kind="numeric",
-                        min_value=min_value,
-                        max_value=max_value,
-                    )
-                )
-            else:
-                distinct_df = vdb.query(
-                    f"SELECT COUNT(DISTINCT {field}) AS cnt "
-                    f"FROM {meta_table} WHERE {field} IS NOT NULL"
-                )
-                distinct_count = int(distinct_df["cnt"].iloc[0])
-                if distinct_count > 0 and distinct_count <= 100:
-                    values_df = vdb.query(
-                        f"SELECT DISTINCT {field} FROM {meta_table} "
-                        f"WHERE {field} IS NOT NULL ORDER BY {field}"
-                    )
-                    values = [str(v) for v in values_df[field].tolist()]
-                    metadata_fields.append(
-                        FilterOption(field=field, kind="categorical", values=values)
-                    )
-
-        # Get repo_id and config_name from VirtualDB's internal map
-        db_name_map = getattr(vdb, "_db_name_map", {})
-        config_info = db_name_map.get(db_name)
-        if isinstance(config_info, tuple) and len(config_info) >= 2:
-            # VirtualDB stores as (repo_id, config_name) tuple
-            repo_id = config_info[0]
-            config_name = config_info[1]
-        elif isinstance(config_info, dict):
-            repo_id = config_info.get("repo_id", "unknown")
-            config_name = config_info.get("config_name", "unknown")
-        else:
-            repo_id = "unknown"
-            config_name = "unknown"
-
-        # Infer dataset type from db_name
-        db_name_lower = db_name.lower()
-        if any(
-            keyword in db_name_lower
-            for keyword in [
-                "binding",
-                "chip",
-                "calling_cards",
-                "occupancy",
-                "chec",
-                "chip-exo",
-            ]
-        ):
-            dataset_type = "Binding"
-        elif any(
-            keyword in db_name_lower
-            for keyword in [
-                "perturb",
-                "expression",
-                "rna",
-                "knockout",
-                "deletion",
-                "overexpression",
-                "comparative",
-                "degron",
-            ]
-        ):
-            dataset_type = "Perturbation"
-        else:
-            dataset_type = "Expression"
-
-    return SourceSummaryEntry(
+        metadata_fields = _filter_options_for_table(vdb, meta_table)
+
+    # Get repo_id and config_name from VirtualDB's internal map
+    db_name_map = getattr(vdb, "_db_name_map", {})
+    config_info = db_name_map.get(db_name)
+    if isinstance(config_info, tuple) and len(config_info) >= 2:
+        # VirtualDB stores as (repo_id, config_name) tuple
+        repo_id = config_info[0]
+        config_name = config_info[1]
+    elif isinstance(config_info, dict):
+        repo_id = config_info.get("repo_id", "unknown")
+        config_name = config_info.get("config_name", "unknown")
+    else:
+        repo_id = "unknown"
+        config_name = "unknown"
+
+    # Infer dataset type from db_name
+    db_name_lower = db_name.lower()
+    if _BINDING_KEYWORDS.search(db_name_lower):
+        dataset_type = "Binding"
+    elif _PERTURBATION_KEYWORDS.search(db_name_lower):
+        dataset_type = "Perturbation"
+    else:
+        dataset_type = "Expression"
+
+    entry = SourceSummaryEntry(
         db_name=db_name,
         repo_id=repo_id,
         config_name=config_name,
@@ -187,6 +271,8 @@ def source_summary(
         column_count=column_count,
         metadata_fields=metadata_fields,
     )
+    _store_source_summary(vdb, entry)
+    return entry
 
 
 @router.post("/analysis/binding", response_model=list[AnalysisDataResponse])
@@ -194,72 +280,10 @@ def binding_analysis(
     body: AnalysisRequest,
     vdb: VirtualDB = Depends(get_vdb),
     lock: threading.Lock = Depends(get_vdb_lock),
-) -> list[AnalysisDataResponse]:
+    accept: str | None = Header(default=None),
+) -> Response:
     """Query binding data from active binding datasets."""
-    dataset_names = [_validate_identifier(d) for d in body.datasets]
-    if not dataset_names:
-        return []
-
-    results: list[AnalysisDataResponse] = []
-
-    with lock:
-        for ds_name in dataset_names:
-            # Verify table exists
-            if ds_name not in vdb.tables():
-                raise HTTPException(
-                    status_code=400, detail=f"Dataset '{ds_name}' not found"
-                )
-
-            # Build WHERE clause from filters
-            where_sql = _build_where_sql(body, ds_name)
-
-            # Count total (for pagination)
-            count_sql = f"SELECT COUNT(*) AS total FROM {ds_name}{where_sql}"
-            total_df = vdb.query(count_sql)
-            total = int(total_df["total"].iloc[0])
-
-            if total == 0:
-                # No results for this dataset
-                results.append(
-                    AnalysisDataResponse(
-                        db_name=ds_name,
-                        data=[],
-                        total=0,
-                        page=body.page,
-                        page_size=body.page_size,
-                        has_next=False,
-                        columns=[],
-                    )
-                )
-                continue
-
-            # Get columns
-            columns = vdb.get_fields(ds_name)
-
-            # Query paginated data
-            offset = (body.page - 1) * body.page_size
-            data_sql = (
-                f"SELECT * FROM {ds_name}{where_sql} "
-                f"LIMIT {body.page_size} OFFSET {offset}"
-            )
-            data_df = vdb.query(data_sql)
-
-            records = data_df.to_dict(orient="records")
-            has_next = (offset + body.page_size) < total
-
-            results.append(
-                AnalysisDataResponse(
-                    db_name=ds_name,
-                    data=records,
-                    total=total,
-                    page=body.page,
-                    page_size=body.page_size,
-                    has_next=has_next,
-                    columns=columns,
-                )
-            )
-
-    return results
+    return _run_analysis(vdb, lock, body, accept)
 
 
 @router.post("/analysis/perturbation", response_model=list[AnalysisDataResponse])
@@ -267,73 +291,11 @@ def perturbation_analysis(
     body: AnalysisRequest,
     vdb: VirtualDB = Depends(get_vdb),
     lock: threading.Lock = Depends(get_vdb_lock),
-) -> list[AnalysisDataResponse]:
+    accept: str | None = Header(default=None),
+) -> Response:
     """Query perturbation data from active perturbation datasets."""
     # Same implementation as binding_analysis - the semantic distinction is in the caller
-    dataset_names = [_validate_identifier(d) for d in body.datasets]
-    if not dataset_names:
-        return []
-
-    results: list[AnalysisDataResponse] = []
-
-    with lock:
-        for ds_name in dataset_names:
-            # Verify table exists
-            if ds_name not in vdb.tables():
-                raise HTTPException(
-                    status_code=400, detail=f"Dataset '{ds_name}' not found"
-                )
-
-            # Build WHERE clause from filters
-            where_sql = _build_where_sql(body, ds_name)
-
-            # Count total (for pagination)
-            count_sql = f"SELECT COUNT(*) AS total FROM {ds_name}{where_sql}"
-            total_df = vdb.query(count_sql)
-            total = int(total_df["total"].iloc[0])
-
-            if total == 0:
-                # No results for this dataset
-                results.append(
-                    AnalysisDataResponse(
-                        db_name=ds_name,
-                        data=[],
-                        total=0,
-                        page=body.page,
-                        page_size=body.page_size,
-                        has_next=False,
-                        columns=[],
-                    )
-                )
-                continue
-
-            # Get columns
-            columns = vdb.get_fields(ds_name)
-
-            # Query paginated data
-            offset = (body.page - 1) * body.page_size
-            data_sql = (
-                f"SELECT * FROM {ds_name}{where_sql} "
-                f"LIMIT {body.page_size} OFFSET {offset}"
-            )
-            data_df = vdb.query(data_sql)
-
-            records = data_df.to_dict(orient="records")
-            has_next = (offset + body.page_size) < total
-
-            results.append(
-                AnalysisDataResponse(
-                    db_name=ds_name,
-                    data=records,
-                    total=total,
-                    page=body.page,
-                    page_size=body.page_size,
-                    has_next=has_next,
-                    columns=columns,
-                )
-            )
-
-    return results
+    return _run_analysis(vdb, lock, body, accept)
 
 
 @router.post("/analysis/correlation", response_model=CorrelationMatrixResponse)
@@ -348,10 +310,10 @@ def correlation_matrix(
 
     with lock:
         # Verify table exists
-        if db_name not in vdb.tables():
+        if db_name not in _table_set(vdb):
             raise HTTPException(status_code=400, detail=f"Dataset '{db_name}' not found")
 
-        fields = vdb.get_fields(db_name)
+        fields = _table_fields(vdb, db_name)
         if value_column not in fields:
             raise HTTPException(
                 status_code=400,
@@ -362,7 +324,7 @@ def correlation_matrix(
         if body.group_by == "regulator":
             try:
                 meta_table = f"{db_name}_meta"
-                meta_fields = vdb.get_fields(meta_table)
+                meta_fields = _table_fields(vdb, meta_table)
                 group_column = _resolve_regulator_identifier(meta_fields, meta_table)
             except Exception as e:
                 raise HTTPException(
@@ -389,9 +351,9 @@ def correlation_matrix(
             f"WHERE {group_column} IS NOT NULL AND {value_column} IS NOT NULL "
             f"GROUP BY {group_column} "
             f"ORDER BY cnt DESC "
-            f"LIMIT {body.max_items}"
+            f"LIMIT $max_items"
         )
-        top_items_df = vdb.query(top_items_sql)
+        top_items_df = vdb.query(top_items_sql, max_items=body.max_items)
 
         if top_items_df.empty:
             return CorrelationMatrixResponse(
@@ -401,77 +363,55 @@ def correlation_matrix(
                 method=body.method,
             )
 
-        labels = [str(item) for item in top_items_df[group_column].tolist()]
-
-        # Compute pairwise correlations
-        # For each pair of items, compute correlation of their value_column vectors
-        from app.schemas import CorrelationCell
-
-        cells: list[CorrelationCell] = []
-
-        for i, label_a in enumerate(labels):
-            for j, label_b in enumerate(labels):
-                if j < i:
-                    continue
-
-                if i == j:
-                    # Self-correlation is always 1.0
-                    cells.append(
-                        CorrelationCell(row=label_a, col=label_b, value=1.0)
-                    )
-                else:
-                    # Compute correlation between the two items
-                    # Get vectors for both items
-                    vectors_sql = f"""
-                        SELECT
-                            {group_column} AS item,
-                            {value_column} AS value
-                        FROM {db_name}
-                        WHERE {group_column} IN ('{label_a}', '{label_b}')
-                          AND {value_column} IS NOT NULL
-                        ORDER BY {group_column}
-                    """
-                    vectors_df = vdb.query(vectors_sql)
-
-                    if vectors_df.empty or len(vectors_df) < 2:
-                        cells.append(
-                            CorrelationCell(row=label_a, col=label_b, value=0.0)
-                        )
-                        continue
-
-                    # Use DuckDB's CORR aggregate function
-                    # Pivot the data to compute correlation
-                    corr_sql = f"""
-                        WITH pairs AS (
-                            SELECT
-                                a.{value_column} AS val_a,
-                                b.{value_column} AS val_b
-                            FROM (
-                                SELECT {value_column}
-                                FROM {db_name}
-                                WHERE {group_column} = '{label_a}'
-                                  AND {value_column} IS NOT NULL
-                            ) a
-                            CROSS JOIN (
-                                SELECT {value_column}
-                                FROM {db_name}
-                                WHERE {group_column} = '{label_b}'
-                                  AND {value_column} IS NOT NULL
-                            ) b
-                        )
-                        SELECT CORR(val_a, val_b) AS correlation
-                        FROM pairs
-                    """
-                    corr_df = vdb.query(corr_sql)
-
-                    if corr_df.empty or corr_df["correlation"].isna().iloc[0]:
-                        correlation = 0.0
-                    else:
-                        correlation = float(corr_df["correlation"].iloc[0])
-
-                    cells.append(
-                        CorrelationCell(row=label_a, col=label_b, value=correlation)
-                    )
+        items = top_items_df[group_column].tolist()
+        labels = [str(item) for item in items]
+
+        # Fetch every selected item's values in one pass, aligned on the target
+        # column when the dataset has one so that correlations compare like rows.
+        # Otherwise rows are paired by position within each item, in an order
+        # fixed by the sample identifier and the value itself so the result is
+        # deterministic.
+        align_expr = next((c for c in _TARGET_COLUMN_CANDIDATES if c in fields), None)
+        if align_expr is None:
+            sample_column = _first_present(_SAMPLE_IDENTIFIER_CANDIDATES, fields)
+            order_keys = [
+                key
+                for key in (sample_column, value_column)
+                if key not in (None, group_column)
+            ]
+            align_expr = (
+                f"row_number() OVER (PARTITION BY {group_column} "
+                f"ORDER BY {', '.join(order_keys)})"
+            )
+        in_clause, param_names = _in_filter_template(db_name, group_column, len(items))
+        vectors_sql = (
+            f"SELECT {group_column} AS item, {align_expr} AS align_key, "
+            f"{value_column} AS value "
+            f"FROM {db_name} "
+            f"WHERE {in_clause} AND {value_column} IS NOT NULL"
+        )
+        vectors_df = vdb.query(vectors_sql, **dict(zip(param_names, items)))
+
+    matrix = (
+        vectors_df.pivot_table(
+            index="align_key", columns="item", values="value", aggfunc="mean"
+        )
+        .reindex(columns=items)
+        .corr(method=body.method)
+        .to_numpy()
+    )
+
+    # Self-correlation is always 1.0; undefined correlations are reported as 0.0
+    matrix = np.nan_to_num(matrix, nan=0.0)
+    np.fill_diagonal(matrix, 1.0)
+    rows, cols = np.triu_indices(len(labels))
+    # Values come straight from the float matrix, so per-cell validation is skipped
+    cells = [
+        CorrelationCell.model_construct(row=labels[i], col=labels[j], value=value)
+        for i, j, value in zip(
+            rows.tolist(), cols.tolist(), matrix[rows, cols].tolist()
+        )
+    ]
 
     return CorrelationMatrixResponse(
         db_name=db_name,
@@ -494,34 +434,29 @@ def filter_options(
     if not dataset_names:
         return FilterOptionsResponse(column=column, values=[])
 
-    unique_values: set[str] = set()
-
     with lock:
-        for ds_name in dataset_names:
-            # Verify table exists
-            if ds_name not in vdb.tables():
-                continue
-
-            # Check if column exists in this dataset
-            fields = vdb.get_fields(ds_name)
-            if column not in fields:
-                continue
-
-            # Query distinct values for this column
-            query_sql = (
-                f"SELECT DISTINCT {column} "
-                f"FROM {ds_name} "
-                f"WHERE {column} IS NOT NULL "
-                f"ORDER BY {column}"
+        tables = _table_set(vdb)
+        eligible = [
+            ds_name
+            for ds_name in dict.fromkeys(dataset_names)
+            if ds_name in tables and column in _table_fields(vdb, ds_name)
+        ]
+        if not eligible:
+            return FilterOptionsResponse(column=column, values=[])
+
+        # UNION deduplicates across datasets whose column has the same type;
+        # values stay typed so they stringify the same way for every dataset.
+        by_type: dict[object, list[str]] = {}
+        for ds_name in eligible:
+            column_type = _column_type_map(vdb, ds_name).get(column) or (ds_name,)
+            by_type.setdefault(column_type, []).append(ds_name)
+        values: set[str] = set()
+        for ds_names in by_type.values():
+            query_sql = " UNION ".join(
+                f"SELECT {column} AS value FROM {ds_name} WHERE {column} IS NOT NULL"
+                for ds_name in ds_names
             )
-            result_df = vdb.query(query_sql)
-
-            if not result_df.empty:
-                # Add values to set (automatically deduplicates)
-                unique_values.update(str(val) for val in result_df[column].tolist())
+            values.update(map(str, vdb.query(query_sql)["value"].tolist()))
 
     # Return sorted list
-    return FilterOptionsResponse(
-        column=column,
-        values=sorted(list(unique_values)),
-    )
+    return FilterOptionsResponse(column=column, values=sorted(values))
@@ -6,6 +6,11 @@ from fastapi import APIRouter, Depends
 from tfbpapi import VirtualDB
 
 from app.dependencies import get_vdb, get_vdb_lock
+from app.routers._query_utils import (
+    _common_fields,
+    _is_comparative_dataset,
+    _table_set,
+)
 from app.schemas import DatasetInfo, HealthResponse
 
 router = APIRouter(tags=["discovery"])
@@ -18,7 +23,7 @@ def health_check(
 ) -> HealthResponse:
     """Check if the API is up and VirtualDB has views registered."""
     with lock:
-        tables = vdb.tables()
+        tables = _table_set(vdb)
     return HealthResponse(status="ok", tables_registered=len(tables))
 
 
@@ -29,25 +34,26 @@ def list_tables(
 ) -> list[str]:
     """List all registered SQL view names."""
     with lock:
-        return vdb.tables()
+        return sorted(_table_set(vdb))
 
 
 @router.get("/datasets", response_model=list[DatasetInfo])
 def list_datasets(
     vdb: VirtualDB = Depends(get_vdb),
+    lock: threading.Lock = Depends(get_vdb_lock),
 ) -> list[DatasetInfo]:
     """List all datasets with metadata (db_name, repo, comparative status)."""
-    results: list[DatasetInfo] = []
-    for db_name, (repo_id, config_name) in vdb._db_name_map.items():
-        results.append(
-            DatasetInfo(
-                db_name=db_name,
-                repo_id=repo_id,
-                config_name=config_name,
-                is_comparative=vdb._is_comparative(repo_id, config_name),
-            )
+    with lock:
+        datasets = list(vdb._db_name_map.items())
+    return [
+        DatasetInfo(
+            db_name=db_name,
+            repo_id=repo_id,
+            config_name=config_name,
+            is_comparative=_is_comparative_dataset(vdb, repo_id, config_name),
         )
-    return results
+        for db_name, (repo_id, config_name) in datasets
+    ]
 
 
 @router.get("/common-fields", response_model=list[str])
@@ -57,4 +63,4 @@ def get_common_fields(
 ) -> list[str]:
     """Get field names shared across all primary _meta views."""
     with lock:
-        return vdb.get_common_fields()
+        return _common_fields(vdb)
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import math
 import threading
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import Response
 from tfbpapi import VirtualDB
 
 from app.dependencies import get_vdb, get_vdb_lock
+from app.responses import RecordsJSONResponse
 from app.routers._query_utils import (
     _build_where_sql,
+    _cached_distinct_values,
+    _cached_table_stat,
     _candidate_regulator_tables,
     _column_type_map,
+    _decode_cursor,
+    _df_to_records,
+    _distinct_values_by_field,
+    _encode_cursor,
     _is_numeric_column_type,
-    _normalize_numeric_stat,
+    _numeric_ranges,
     _resolve_join_sample_identifier,
     _resolve_regulator_identifier,
     _resolve_sample_identifier,
+    _store_distinct_values,
+    _store_table_stat,
+    _table_fields,
+    _table_set,
     _validate_identifier,
 )
 from app.schemas import (
@@ -27,14 +40,26 @@ from app.schemas import (
 
 router = APIRouter(tags=["query"])
 
+_CURSOR_PARAM = "__cursor"
+
 
 @router.post("/query", response_model=PaginatedResponse)
 def execute_query(
     body: QueryRequest,
     vdb: VirtualDB = Depends(get_vdb),
     lock: threading.Lock = Depends(get_vdb_lock),
-) -> PaginatedResponse:
-    """Execute parameterized SQL with pagination."""
+) -> Response:
+    """Execute parameterized SQL with pagination.
+
+    The total comes from a separate COUNT(*), which DuckDB can answer without
+    materializing the result the way a window count over the page query must.
+    Requests with ``order_by`` are served as keyset pages instead.
+    """
+    if body.order_by is not None:
+        return _keyset_page(vdb, lock, body)
+    if body.cursor is not None:
+        raise ValueError("cursor requires order_by")
+
     offset = (body.page - 1) * body.page_size
 
     count_sql = f"SELECT COUNT(*) AS total FROM ({body.sql}) AS _q"
@@ -48,13 +73,86 @@ def execute_query(
         total = int(total_df["total"].iloc[0])
         data_df = vdb.query(paginated_sql, **body.params)
 
-    records = data_df.to_dict(orient="records")
-    return PaginatedResponse(
-        data=records,
-        total=total,
-        page=body.page,
-        page_size=body.page_size,
-        has_next=(offset + body.page_size) < total,
+    # The payload mirrors PaginatedResponse; returning the response directly skips
+    # validating every record against the response model.
+    return RecordsJSONResponse(
+        {
+            "data": _df_to_records(data_df),
+            "total": total,
+            "page": body.page,
+            "page_size": body.page_size,
+            "has_next": (offset + body.page_size) < total,
+            "next_cursor": None,
+        }
+    )
+
+
+def _keyset_page(vdb: VirtualDB, lock: threading.Lock, body: QueryRequest) -> Response:
+    """Fetch the rows after ``body.cursor`` in ``body.order_by`` order.
+
+    Filtering on the last key seen replaces a deep OFFSET, so later pages cost
+    about the same as the first. Rows are ordered by the key with NULLs last and
+    then by the whole row, and the cursor carries how many rows sharing the last
+    key were already returned, so ties and NULL keys page through without gaps.
+    One extra row is fetched to tell whether another page exists; no total is
+    computed.
+    """
+    if body.page != 1:
+        raise ValueError("page must be 1 with order_by; pass cursor to advance")
+    key = _validate_identifier(body.order_by)
+    params = dict(body.params)
+    where_sql = ""
+    last_key, skip = None, 0
+    if body.cursor is not None:
+        last_key, skip = _decode_cursor(body.cursor)
+        if isinstance(last_key, float) and math.isnan(last_key):
+            # DuckDB sorts NaN above every number; float NULLs also arrive as NaN.
+            where_sql = f" WHERE isnan({key}) OR {key} IS NULL"
+        elif last_key is None:
+            where_sql = f" WHERE {key} IS NULL"
+        else:
+            params[_CURSOR_PARAM] = last_key
+            where_sql = f" WHERE {key} >= ${_CURSOR_PARAM} OR {key} IS NULL"
+    page_sql = (
+        f"SELECT * FROM ({body.sql}) AS _q{where_sql} "
+        f"ORDER BY {key} NULLS LAST, _q LIMIT {body.page_size + 1} OFFSET {skip}"
+    )
+
+    with lock:
+        data_df = vdb.query(page_sql, **params)
+
+    if key not in data_df.columns:
+        # The cursor is read back from the result rows, so the key must be one.
+        raise ValueError(f"order_by column '{key}' is not in the query result")
+    records = _df_to_records(data_df)
+    has_next = len(records) > body.page_size
+    del records[body.page_size :]
+    next_cursor = None
+    if has_next:
+        keys = [record[key] for record in records]
+        if data_df[key].dtype.kind != "f":
+            # Missing strings also come back as NaN; only float columns hold NaN.
+            keys = [None if isinstance(k, float) and math.isnan(k) else k for k in keys]
+        # Keys are compared in cursor form, which equates NULLs and NaNs.
+        tail = _encode_cursor(keys[-1], 0)
+        ties = 0
+        for value in reversed(keys):
+            if _encode_cursor(value, 0) != tail:
+                break
+            ties += 1
+        if ties == len(keys) and body.cursor is not None:
+            if _encode_cursor(last_key, 0) == tail:
+                ties += skip
+        next_cursor = _encode_cursor(keys[-1], ties)
+    return RecordsJSONResponse(
+        {
+            "data": records,
+            "total": None,
+            "page": body.page,
+            "page_size": body.page_size,
+            "has_next": has_next,
+            "next_cursor": next_cursor,
+        }
     )
 
 
@@ -64,12 +162,12 @@ def sample_rows(
     n: int = Query(default=10, ge=1, le=1000),
     vdb: VirtualDB = Depends(get_vdb),
     lock: threading.Lock = Depends(get_vdb_lock),
-) -> list[dict]:
+) -> Response:
     """Get the first N rows from a table/view."""
     table = _validate_identifier(table)
     with lock:
         df = vdb.query(f"SELECT * FROM {table} LIMIT {n}")
-    return df.to_dict(orient="records")
+    return RecordsJSONResponse(_df_to_records(df))
 
 
 @router.get("/tables/{table}/distinct/{field}", response_model=list)
@@ -82,12 +180,16 @@ def distinct_values(
     """Get distinct values for a field in a table/view."""
     table = _validate_identifier(table)
     field = _validate_identifier(field)
-    with lock:
-        df = vdb.query(
-            f"SELECT DISTINCT {field} FROM {table} "
-            f"WHERE {field} IS NOT NULL ORDER BY {field}"
-        )
-    return df[field].tolist()
+    values = _cached_distinct_values(vdb, table, field)
+    if values is None:
+        with lock:
+            df = vdb.query(
+                f"SELECT DISTINCT {field} FROM {table} "
+                f"WHERE {field} IS NOT NULL ORDER BY {field}"
+            )
+        values = df[field].tolist()
+        _store_distinct_values(vdb, table, field, values)
+    return values
 
 
 @router.get("/tables/{table}/count", response_model=int)
@@ -98,9 +200,14 @@ def row_count(
 ) -> int:
     """Get row count for a table/view."""
     table = _validate_identifier(table)
-    with lock:
-        df = vdb.query(f"SELECT COUNT(*) AS cnt FROM {table}")
-    return int(df["cnt"].iloc[0])
+    key = ("count", table)
+    count = _cached_table_stat(vdb, key)
+    if count is None:
+        with lock:
+            df = vdb.query(f"SELECT COUNT(*) AS cnt FROM {table}")
+        count = int(df["cnt"].iloc[0])
+        _store_table_stat(vdb, key, count)
+    return count
 
 
 @router.get(
@@ -114,7 +221,7 @@ def filter_options(
     """Get filter metadata for all columns in a _meta view (for filter UI)."""
     table = _validate_identifier(table)
     with lock:
-        available_tables = set(vdb.tables())
+        available_tables = _table_set(vdb)
         query_table = table
 
         if query_table not in available_tables and table.endswith("_meta"):
@@ -130,40 +237,42 @@ def filter_options(
                     # source data); return no options instead of failing the selection UI.
                     return []
 
-        fields = vdb.get_fields(query_table)
+        fields = [
+            field
+            for field in _table_fields(vdb, query_table)
+            if field not in {"sample_id", "sra_accession", "id"}
+        ]
         type_map = _column_type_map(vdb, query_table)
-        result: list[FilterOption] = []
-        for field in fields:
-            if field in {"sample_id", "sra_accession", "id"}:
+        numeric_fields = [
+            field for field in fields if _is_numeric_column_type(type_map.get(field))
+        ]
+        numeric_set = set(numeric_fields)
+        ranges = _numeric_ranges(vdb, query_table, numeric_fields)
+        categorical = _distinct_values_by_field(
+            vdb,
+            query_table,
+            [field for field in fields if field not in numeric_set],
+            limit=None,
+        )
+
+    result: list[FilterOption] = []
+    for field in fields:
+        if field in numeric_set:
+            min_value, max_value = ranges[field]
+            if min_value is None and max_value is None:
                 continue
-            if _is_numeric_column_type(type_map.get(field)):
-                range_df = vdb.query(
-                    f"SELECT MIN({field}) AS min_value, MAX({field}) AS max_value "
-                    f"FROM {query_table} WHERE {field} IS NOT NULL"
+            result.append(
+                FilterOption(
+                    field=field,
+                    kind="numeric",
+                    min_value=min_value,
+                    max_value=max_value,
                 )
-                min_value = _normalize_numeric_stat(range_df["min_value"].iloc[0])
-                max_value = _normalize_numeric_stat(range_df["max_value"].iloc[0])
-                if min_value is None and max_value is None:
-                    continue
-                result.append(
-                    FilterOption(
-                        field=field,
-                        kind="numeric",
-                        min_value=min_value,
-                        max_value=max_value,
-                    )
-                )
-                continue
-
-            df = vdb.query(
-                f"SELECT DISTINCT {field} FROM {query_table} "
-                f"WHERE {field} IS NOT NULL ORDER BY {field}"
             )
-            values = [str(v) for v in df[field].tolist()]
-            if values:
-                result.append(
-                    FilterOption(field=field, kind="categorical", values=values)
-                )
+        elif categorical.get(field):
+            result.append(
+                FilterOption(field=field, kind="categorical", values=categorical[field])
+            )
     return result
 
 
@@ -175,18 +284,29 @@ def compute_intersection(
 ) -> list[IntersectionCell]:
     """Compute pairwise regulator overlap between selected datasets."""
     dataset_names = [_validate_identifier(d) for d in body.datasets]
+    if not dataset_names:
+        return []
 
-    # Build regulator sets for each dataset
-    regulator_sets: dict[str, set[str]] = {}
+    # Build one regulator subquery per dataset, then count overlaps in one query
+    unique_names = list(dict.fromkeys(dataset_names))
+    regulator_selects: list[str] = []
+    intersection_params: dict[str, object] = {}
     with lock:
-        available_tables = set(vdb.tables())
+        available_tables = _table_set(vdb)
         configured_datasets = set(getattr(vdb, "_db_name_map", {}).keys())
 
-        for ds_name in dataset_names:
+        for index, ds_name in enumerate(unique_names):
             base_meta_table = _validate_identifier(f"{ds_name}_meta")
             base_meta_available = base_meta_table in available_tables
-            base_fields = vdb.get_fields(base_meta_table) if base_meta_available else []
-            where_sql = _build_where_sql(body, ds_name) if base_meta_available else ""
+            # Unfiltered datasets skip the schema lookups the WHERE clause needs
+            has_filters = bool(
+                body.filters.get(ds_name) or body.numeric_filters.get(ds_name)
+            )
+            where_sql, where_params = (
+                _build_where_sql(body, ds_name, _column_type_map(vdb, base_meta_table))
+                if base_meta_available and has_filters
+                else ("", {})
+            )
 
             resolved = False
             checked_tables: list[str] = []
@@ -198,7 +318,7 @@ def compute_intersection(
                     continue
                 checked_tables.append(table)
                 try:
-                    fields = vdb.get_fields(table)
+                    fields = _table_fields(vdb, table)
                 except Exception:
                     continue
 
@@ -207,7 +327,9 @@ def compute_intersection(
                 except ValueError:
                     continue
 
+                params: dict[str, object] = {}
                 if table == base_meta_table:
+                    params = where_params
                     sql = (
                         f"SELECT DISTINCT {regulator_field} AS regulator "
                         f"FROM {table}{where_sql}"
@@ -223,7 +345,7 @@ def compute_intersection(
                     elif base_meta_available:
                         if base_sample_field is None:
                             base_sample_field = _resolve_sample_identifier(
-                                base_fields, base_meta_table
+                                _table_fields(vdb, base_meta_table), base_meta_table
                             )
                         source_sample_field = _resolve_join_sample_identifier(
                             fields=fields,
@@ -241,6 +363,7 @@ def compute_intersection(
                             f"ON CAST(src.{source_sample_field} AS VARCHAR) = "
                             f"CAST(f.__sample_id AS VARCHAR)"
                         )
+                        params = where_params
                     else:
                         # Dataset is configured but no *_meta table was registered;
                         # fall back to direct regulator extraction from source table.
@@ -249,10 +372,11 @@ def compute_intersection(
                             f"FROM {table} AS src"
                         )
 
-                df = vdb.query(sql)
-                regulator_sets[ds_name] = set(
-                    df["regulator"].dropna().astype(str).tolist()
+                regulator_selects.append(
+                    f"SELECT {index} AS ds, CAST(regulator AS VARCHAR) AS regulator "
+                    f"FROM ({sql}) WHERE regulator IS NOT NULL"
                 )
+                intersection_params.update(params)
                 resolved = True
                 break
 
@@ -271,18 +395,33 @@ def compute_intersection(
                     f"Checked tables: {checked}"
                 )
 
-    # Compute pairwise intersections
+        # Self-join on regulator to count every pair's overlap in one pass
+        overlap_sql = (
+            f"WITH u AS ({' UNION ALL '.join(regulator_selects)}) "
+            "SELECT a.ds AS ds_a, b.ds AS ds_b, COUNT(*) AS overlap "
+            "FROM u AS a JOIN u AS b USING (regulator) "
+            "WHERE a.ds <= b.ds GROUP BY a.ds, b.ds"
+        )
+        overlap_df = vdb.query(overlap_sql, **intersection_params)
+
+    overlaps = {
+        (unique_names[ds_a], unique_names[ds_b]): int(overlap)
+        for ds_a, ds_b, overlap in zip(
+            overlap_df["ds_a"].tolist(),
+            overlap_df["ds_b"].tolist(),
+            overlap_df["overlap"].tolist(),
+        )
+    }
+    order = {ds_name: index for index, ds_name in enumerate(unique_names)}
+
+    # Assemble the upper triangle in request order
     cells: list[IntersectionCell] = []
     for i, ds_a in enumerate(dataset_names):
-        for j, ds_b in enumerate(dataset_names):
-            if j < i:
-                continue
-            if i == j:
-                count = len(regulator_sets.get(ds_a, set()))
-            else:
-                set_a = regulator_sets.get(ds_a, set())
-                set_b = regulator_sets.get(ds_b, set())
-                count = len(set_a & set_b)
-            cells.append(IntersectionCell(row=ds_a, col=ds_b, count=count))
+        for j in range(i, len(dataset_names)):
+            ds_b = dataset_names[j]
+            key = (ds_a, ds_b) if order[ds_a] <= order[ds_b] else (ds_b, ds_a)
+            cells.append(
+                IntersectionCell(row=ds_a, col=ds_b, count=overlaps.get(key, 0))
+            )
 
     return cells
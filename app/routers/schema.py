@@ -21,8 +21,10 @@ def describe_table(
     with lock:
         df = vdb.describe(table)
     return [
-        ColumnInfo(column_name=row["column_name"], column_type=row["column_type"])
-        for _, row in df.iterrows()
+        ColumnInfo(column_name=name, column_type=column_type)
+        for name, column_type in zip(
+            df["column_name"].tolist(), df["column_type"].tolist()
+        )
     ]
 
 
@@ -6,22 +6,33 @@ from pydantic import BaseModel, Field
 
 
 class PaginatedResponse(BaseModel, frozen=True):
-    """Paginated query result."""
+    """Paginated query result.
+
+    Keyset pages (requests with ``order_by``) report ``total=None`` and return a
+    ``next_cursor`` to pass back for the following page.
+    """
 
     data: list[dict]
-    total: int
+    total: int | None
     page: int
     page_size: int
     has_next: bool
+    next_cursor: str | None = None
 
 
 class QueryRequest(BaseModel, frozen=True):
-    """Request body for the POST /query endpoint."""
+    """Request body for the POST /query endpoint.
+
+    Setting ``order_by`` to a result column switches to keyset pagination:
+    ``page`` must stay 1 and ``cursor`` selects the rows after the previous page.
+    """
 
     sql: str
     params: dict[str, str | int | float | bool] = Field(default_factory=dict)
     page: int = Field(default=1, ge=1)
     page_size: int = Field(default=100, ge=1, le=10000)
+    order_by: str | None = None
+    cursor: str | None = None
 
 
 class DatasetInfo(BaseModel, frozen=True):
@@ -135,6 +146,10 @@ class AnalysisRequest(BaseModel, frozen=True):
     )
     page: int = Field(default=1, ge=1)
     page_size: int = Field(default=100, ge=1, le=10000)
+    columns: list[str] | None = None
+    # When false, pages after the first reuse the total counted for an earlier
+    # page of the same filtered query instead of running COUNT(*) again.
+    use_exact_count: bool = True
 
 
 class SourceSummaryEntry(BaseModel, frozen=True):
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import re
 import threading
-from typing import AsyncIterator
+from functools import lru_cache
+from typing import Iterator
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
@@ -13,6 +16,162 @@ from httpx import ASGITransport, AsyncClient
 # With env_prefix="TFBP_", field "config_path" reads TFBP_CONFIG_PATH.
 os.environ.setdefault("TFBP_CONFIG_PATH", "/dev/null")
 
+from app.config import get_settings  # noqa: E402
+from app.main import create_app  # noqa: E402
+
+# SQL shapes recognized by the mock VirtualDB, compiled once per session.
+_RE_DATASET_INDEX = re.compile(r"select (\d+) as ds,")
+_RE_COUNT_ALIAS = re.compile(r"count\([^)]*\)\s+as\s+(\w+)")
+_RE_FIELD_NAME = re.compile(r"select '(\w+)' as field_name")
+_RE_GROUPBY = re.compile(r"select\s+(\w+)\s*,\s*count")
+_RE_MINMAX_ALIAS = re.compile(r"as (m(?:in|ax)_\w+)")
+_RE_STAT_ALIAS = re.compile(r"as ((?:min|max|approx)_\w+)")
+_RE_DISTINCT_ALIAS = re.compile(r"distinct\s+(\w+)\s+as\s+(\w+)")
+_RE_DISTINCT = re.compile(r"distinct\s+(\w+)")
+
+# Constant mock results, built once. The app never mutates query results in place.
+_REGULATORS = ["TF1", "TF2", "TF3"]
+_SAMPLE_ROWS = {
+    "sample_id": [1, 2, 3],
+    "regulator_symbol": _REGULATORS,
+    "effect": [0.5, -0.3, 1.2],
+    "target_locus_tag": ["YAL001C", "YAL002W", "YAL003W"],
+    "pvalue": [0.001, 0.005, 0.01],
+}
+_META_FIELDS = ["sample_id", "regulator_symbol", "carbon_source", "effect"]
+_DATA_FIELDS = ["sample_id", "regulator_symbol", "target_locus_tag", "effect", "pvalue"]
+_DF_DESCRIBE = pd.DataFrame(
+    {
+        "column_name": _META_FIELDS,
+        "column_type": ["INTEGER", "VARCHAR", "VARCHAR", "DOUBLE"],
+    }
+)
+_DF_SAMPLE_ROWS = pd.DataFrame(_SAMPLE_ROWS)
+_DF_TOP_REGULATORS = pd.DataFrame(
+    {"regulator_symbol": _REGULATORS, "cnt": [100, 95, 90]}
+)
+_DF_TOP_SAMPLES = pd.DataFrame({"sample_id": [1, 2, 3], "cnt": [100, 95, 90]})
+_DF_UNION_VALUES = pd.DataFrame({"value": ["ACE2", "GAL4", "SWI4"]})
+_DF_COUNT_CNT = pd.DataFrame({"cnt": [42]})
+_DF_COUNT_TOTAL = pd.DataFrame({"total": [42]})
+
+
+def _mock_overlaps(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Pairwise regulator overlaps (for active-set intersection)."""
+    count = len(_RE_DATASET_INDEX.findall(sql_lower))
+    pairs = [(a, b) for a in range(count) for b in range(a, count)]
+    return pd.DataFrame(
+        {
+            "ds_a": [a for a, _ in pairs],
+            "ds_b": [b for _, b in pairs],
+            "overlap": [3 if a == b else 2 for a, b in pairs],
+        }
+    )
+
+
+def _mock_field_stats(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """MIN/MAX and approximate distinct counts (for source summary metadata fields)."""
+    aliases = _RE_STAT_ALIAS.findall(sql_lower)
+    stats = {"min": 0.1, "max": 9.9, "approx": 3}
+    return pd.DataFrame({alias: [stats[alias.split("_", 1)[0]]] for alias in aliases})
+
+
+def _mock_batched_counts(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Batched scalar counts (for source summary)."""
+    aliases = _RE_COUNT_ALIAS.findall(sql_lower)
+    return pd.DataFrame({alias: [42] for alias in aliases})
+
+
+def _mock_field_values(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Batched distinct values per field (for filter options)."""
+    fields = _RE_FIELD_NAME.findall(sql_lower)
+    values = ["glucose", "galactose", "raffinose"]
+    return pd.DataFrame(
+        {
+            "field_name": [field for field in fields for _ in values],
+            "value": values * len(fields),
+            "ord": [1, 2, 3] * len(fields),
+        }
+    )
+
+
+def _mock_top_items(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Top items by row count (for correlation matrix)."""
+    grouped_by_sample = "sample_id" in sql_lower and "regulator" not in sql_lower
+    if _RE_GROUPBY.search(sql_lower) and grouped_by_sample:
+        return _DF_TOP_SAMPLES
+    return _DF_TOP_REGULATORS
+
+
+def _mock_aligned_values(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Aligned value vectors (for correlation matrix)."""
+    items = list(params.values())
+    return pd.DataFrame(
+        {
+            "item": [item for item in items for _ in range(3)],
+            "align_key": ["YAL001C", "YAL002W", "YAL003W"] * len(items),
+            "value": [float(i * 0.1 + k) for i in range(len(items)) for k in (1, 2, 4)],
+        }
+    )
+
+
+def _mock_union_values(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Distinct values unioned across datasets (for analysis filter options)."""
+    return _DF_UNION_VALUES
+
+
+def _mock_ranges(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """Batched MIN/MAX per numeric field (for filter options)."""
+    aliases = _RE_MINMAX_ALIAS.findall(sql_lower)
+    return pd.DataFrame(
+        {alias: [0.1 if alias.startswith("min_") else 9.9] for alias in aliases}
+    )
+
+
+def _mock_count_distinct(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    return _DF_COUNT_CNT
+
+
+def _mock_count(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    return _DF_COUNT_TOTAL if "total" in sql_lower else _DF_COUNT_CNT
+
+
+@lru_cache(maxsize=None)
+def _distinct_frame(column: str, values: tuple[str, ...]) -> pd.DataFrame:
+    """Single-column DISTINCT result, built once per column name."""
+    return pd.DataFrame({column: list(values)})
+
+
+def _mock_distinct_or_rows(sql_lower: str, params: dict[str, object]) -> pd.DataFrame:
+    """DISTINCT values named after the selected column or alias, else sample rows."""
+    alias_match = _RE_DISTINCT_ALIAS.search(sql_lower)
+    if alias_match:
+        return _distinct_frame(alias_match.group(2), ("TF1", "TF2", "TF3"))
+
+    distinct_match = _RE_DISTINCT.search(sql_lower)
+    if distinct_match:
+        col = distinct_match.group(1)
+        if "regulator" in col:
+            return _distinct_frame(col, ("ACE2", "GAL4", "SWI4"))
+        return _distinct_frame(col, ("glucose", "galactose", "raffinose"))
+
+    return _DF_SAMPLE_ROWS
+
+
+# First matching SQL fragment wins, so more specific shapes come first.
+_QUERY_DISPATCH = (
+    ("as ds_a", _mock_overlaps),
+    ("approx_count_distinct", _mock_field_stats),
+    ("select * from (select count", _mock_batched_counts),
+    ("as field_name", _mock_field_values),
+    ("group by", _mock_top_items),
+    ("align_key", _mock_aligned_values),
+    ("as value from", _mock_union_values),
+    ("min(", _mock_ranges),
+    ("count(distinct", _mock_count_distinct),
+    ("count(*)", _mock_count),
+)
+
 
 @pytest.fixture
 def mock_vdb() -> MagicMock:
@@ -45,127 +204,60 @@ def mock_vdb() -> MagicMock:
     ]
 
     # describe()
-    def mock_describe(table: str | None = None) -> pd.DataFrame:
-        return pd.DataFrame(
-            {
-                "column_name": [
-                    "sample_id",
-                    "regulator_symbol",
-                    "carbon_source",
-                    "effect",
-                ],
-                "column_type": ["INTEGER", "VARCHAR", "VARCHAR", "DOUBLE"],
-            }
-        )
-
-    vdb.describe.side_effect = mock_describe
+    vdb.describe.return_value = _DF_DESCRIBE
 
     # get_fields()
     def mock_get_fields(table: str | None = None) -> list[str]:
-        if table and "meta" in table:
-            return ["sample_id", "regulator_symbol", "carbon_source", "effect"]
-        return ["sample_id", "regulator_symbol", "target_locus_tag", "effect", "pvalue"]
+        return _META_FIELDS if table and "meta" in table else _DATA_FIELDS
 
     vdb.get_fields.side_effect = mock_get_fields
 
     # query() — return different data depending on SQL
     def mock_query(sql: str, **params: object) -> pd.DataFrame:
-        import re
-
         sql_lower = sql.lower()
-
-        # Top items queries (for correlation matrix) — CHECK THIS FIRST before COUNT(*)
-        # Pattern: SELECT column_name, COUNT(*) ... GROUP BY column_name
-        if "group by" in sql_lower:
-            # Extract the group-by column from the SQL
-            # Pattern: "SELECT column_name, COUNT(*)" or "select column_name, count(*)"
-            select_match = re.search(r"select\s+(\w+)\s*,\s*count", sql_lower)
-            if select_match:
-                col_name_lower = select_match.group(1)
-                # Find the original case column name
-                if "regulator_symbol" in sql_lower or "regulator" in sql_lower:
-                    return pd.DataFrame({
-                        "regulator_symbol": ["TF1", "TF2", "TF3"],
-                        "cnt": [100, 95, 90]
-                    })
-                elif "sample_id" in sql_lower:
-                    return pd.DataFrame({
-                        "sample_id": [1, 2, 3],
-                        "cnt": [100, 95, 90]
-                    })
-            # Default fallback for GROUP BY
-            return pd.DataFrame({
-                "regulator_symbol": ["TF1", "TF2", "TF3"],
-                "cnt": [100, 95, 90]
-            })
-
-        # CORR queries (for correlation matrix)
-        if "corr(" in sql_lower:
-            return pd.DataFrame({"correlation": [0.85]})
-
-        # MIN/MAX queries
-        if "min(" in sql_lower and "max(" in sql_lower:
-            return pd.DataFrame({"min_value": [0.1], "max_value": [9.9]})
-
-        # COUNT DISTINCT queries
-        if "count(distinct" in sql_lower:
-            return pd.DataFrame({"cnt": [42]})
-
-        # COUNT queries (must come after GROUP BY check)
-        if "count(*)" in sql_lower:
-            return pd.DataFrame({"total": [42]}) if "total" in sql_lower else pd.DataFrame({"cnt": [42]})
-
-        # Handle "SELECT DISTINCT field AS alias" — return alias as column name
-        alias_match = re.search(r"distinct\s+(\w+)\s+as\s+(\w+)", sql_lower)
-        if alias_match:
-            alias = alias_match.group(2)
-            return pd.DataFrame({alias: ["TF1", "TF2", "TF3"]})
-
-        # Handle "SELECT DISTINCT field" — return field as column name
-        distinct_match = re.search(r"distinct\s+(\w+)", sql_lower)
-        if distinct_match:
-            col = distinct_match.group(1)
-            # Return appropriate values based on column name
-            if "regulator" in col:
-                return pd.DataFrame({col: ["ACE2", "GAL4", "SWI4"]})
-            else:
-                return pd.DataFrame({col: ["glucose", "galactose", "raffinose"]})
-
-        # Default: return sample rows
-        return pd.DataFrame(
-            {
-                "sample_id": [1, 2, 3],
-                "regulator_symbol": ["TF1", "TF2", "TF3"],
-                "effect": [0.5, -0.3, 1.2],
-                "target_locus_tag": ["YAL001C", "YAL002W", "YAL003W"],
-                "pvalue": [0.001, 0.005, 0.01],
-            }
-        )
+        for needle, handler in _QUERY_DISPATCH:
+            if needle in sql_lower:
+                return handler(sql_lower, params)
+        return _mock_distinct_or_rows(sql_lower, params)
 
     vdb.query.side_effect = mock_query
 
     return vdb
 
 
+@pytest.fixture(scope="session")
+def _session_app():
+    """Build the FastAPI app once; tests swap in their own VirtualDB mock."""
+    # Clear cached settings so the app picks up the test environment.
+    get_settings.cache_clear()
+    return create_app()
+
+
 @pytest.fixture
-def test_app(mock_vdb: MagicMock):
-    """Create FastAPI test app with mocked VirtualDB."""
-    from app.config import get_settings
+def test_app(_session_app, mock_vdb: MagicMock):
+    """FastAPI test app with a fresh mocked VirtualDB and lock.
 
-    # Clear cached settings so each test gets a fresh instance.
-    get_settings.cache_clear()
+    The mock stays function-scoped: tests mutate it, and the per-VirtualDB
+    schema caches are keyed on the instance.
+    """
+    _session_app.state.vdb = mock_vdb
+    _session_app.state.vdb_lock = threading.Lock()
+    yield _session_app
+    # Drop per-test state so the mock (and its weak-keyed caches) can be freed.
+    del _session_app.state.vdb
+    del _session_app.state.vdb_lock
 
-    from app.main import create_app
 
-    app = create_app()
-    app.state.vdb = mock_vdb
-    app.state.vdb_lock = threading.Lock()
-    return app
+@pytest.fixture(scope="session")
+def _session_client(_session_app) -> Iterator[AsyncClient]:
+    """One HTTP client for the session; ASGITransport holds no connections."""
+    transport = ASGITransport(app=_session_app)
+    ac = AsyncClient(transport=transport, base_url="http://test")
+    yield ac
+    asyncio.run(ac.aclose())
 
 
 @pytest.fixture
-async def client(test_app) -> AsyncIterator[AsyncClient]:
-    """Async HTTP test client."""
-    transport = ASGITransport(app=test_app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
-        yield ac
+def client(test_app, _session_client: AsyncClient) -> AsyncClient:
+    """Async HTTP test client bound to this test's app state."""
+    return _session_client
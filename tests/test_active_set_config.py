@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+import os
+from pathlib import Path
+import stat
+from unittest.mock import patch
+
+from httpx import AsyncClient
+import pytest
+import yaml
+
+from app.config import Settings, get_settings
+from app.dataset_catalog import DATASET_CATALOG
+from app.routers import active_set_config
+from app.routers.active_set_config import _write_metadata_config
+
+
+@pytest.fixture
+def settings(test_app, tmp_path: Path) -> Iterator[Settings]:
+    """Point the app at a throwaway config file."""
+    settings = Settings(config_path=str(tmp_path / "vdb.yaml"), hf_token=None)
+    test_app.dependency_overrides[get_settings] = lambda: settings
+    yield settings
+    del test_app.dependency_overrides[get_settings]
+
+
+@pytest.mark.asyncio
+async def test_sync_with_unchanged_selection_skips_rebuild(
+    client: AsyncClient, test_app, mock_vdb, settings: Settings
+) -> None:
+    with (
+        patch.object(active_set_config, "VirtualDB") as virtual_db,
+        patch.object(active_set_config, "_invalidate_schema_cache") as invalidate,
+    ):
+        resp = await client.post(
+            "/api/v1/active-set/sync-config",
+            json={"dataset_ids": ["harbison", "kemmeren", "harbison"]},
+        )
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "config_path": settings.config_path,
+        "active_dataset_ids": ["harbison", "kemmeren"],
+        "active_dataset_count": 2,
+    }
+    virtual_db.assert_not_called()
+    invalidate.assert_not_called()
+    assert test_app.state.vdb is mock_vdb
+    written = yaml.safe_load(Path(settings.config_path).read_text(encoding="utf-8"))
+    assert set(written["repositories"]) == {
+        "BrentLab/harbison_2004",
+        "BrentLab/kemmeren_2014",
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_with_changed_selection_rebuilds_and_invalidates(
+    client: AsyncClient, test_app, settings: Settings
+) -> None:
+    Path(settings.config_path).write_text(
+        yaml.safe_dump(
+            {
+                "repositories": {
+                    "BrentLab/hackett_2020": {
+                        "dataset": {"hackett_2020": {"db_name": "hackett"}}
+                    },
+                    "someone/else": {"dataset": {"custom": {"db_name": "custom"}}},
+                }
+            }
+        ),
+        encoding="utf-8",
+    )
+    with (
+        patch.object(active_set_config, "VirtualDB") as virtual_db,
+        patch.object(active_set_config, "_invalidate_schema_cache") as invalidate,
+    ):
+        resp = await client.post(
+            "/api/v1/active-set/sync-config", json={"dataset_ids": ["harbison"]}
+        )
+    assert resp.status_code == 200
+    virtual_db.assert_called_once_with(settings.config_path, token=None)
+    invalidate.assert_called_once_with()
+    assert test_app.state.vdb is virtual_db.return_value
+    written = yaml.safe_load(Path(settings.config_path).read_text(encoding="utf-8"))
+    # Catalog-managed entries are replaced; unmanaged repositories are kept.
+    assert written["repositories"] == {
+        "someone/else": {"dataset": {"custom": {"db_name": "custom"}}},
+        "BrentLab/harbison_2004": {
+            "dataset": {
+                "harbison_2004": {
+                    "db_name": "harbison",
+                    "sample_id": {"field": "sample_id"},
+                }
+            }
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_rejects_unknown_dataset(
+    client: AsyncClient, settings: Settings
+) -> None:
+    resp = await client.post(
+        "/api/v1/active-set/sync-config", json={"dataset_ids": ["nope"]}
+    )
+    assert resp.status_code == 400
+    assert not Path(settings.config_path).exists()
+
+
+@pytest.mark.asyncio
+async def test_dataset_catalog_merges_hf_metadata(
+    client: AsyncClient, settings: Settings
+) -> None:
+    def columns(repo_id: str, token: str | None) -> dict[str, list[str]]:
+        if repo_id == "BrentLab/harbison_2004":
+            return {"harbison_2004": ["sample_id", "effect"]}
+        return {}
+
+    def sizes(repo_id: str, token: str | None) -> dict:
+        if repo_id == "BrentLab/harbison_2004":
+            return {"harbison_2004": (100, None)}
+        return {}
+
+    with (
+        patch.object(active_set_config, "_config_columns", side_effect=columns) as cols,
+        patch.object(active_set_config, "_config_size_map", side_effect=sizes),
+    ):
+        resp = await client.get("/api/v1/dataset-catalog")
+    assert resp.status_code == 200
+    entries = {entry["id"]: entry for entry in resp.json()}
+    assert list(entries) == [item.id for item in DATASET_CATALOG]
+    # Each repository's datacard is resolved once, however many configs it has.
+    assert cols.call_count == len({item.repo_id for item in DATASET_CATALOG})
+
+    harbison = entries["harbison"]
+    assert harbison["is_active"] is True
+    assert harbison["estimated_rows"] == 100
+    assert harbison["num_columns"] == 2
+    assert harbison["column_names"] == ["sample_id", "effect"]
+    assert entries["kemmeren"]["is_active"] is True
+    hackett = entries["hackett"]
+    assert hackett["is_active"] is False
+    assert hackett["estimated_rows"] is None
+    assert hackett["num_columns"] is None
+
+
+def test_write_metadata_config_replaces_symlink_target(tmp_path: Path) -> None:
+    target = tmp_path / "configs" / "vdb.yaml"
+    target.parent.mkdir()
+    target.write_text("repositories: {}\n", encoding="utf-8")
+    target.chmod(0o640)
+    link = tmp_path / "vdb.yaml"
+    link.symlink_to(target)
+
+    payload = {"repositories": {"BrentLab/harbison_2004": {"dataset": {}}}}
+    _write_metadata_config(link, payload)
+
+    assert link.is_symlink()
+    assert yaml.safe_load(target.read_text(encoding="utf-8")) == payload
+    assert stat.S_IMODE(target.stat().st_mode) == 0o640
+    assert os.listdir(target.parent) == ["vdb.yaml"]
+
+
+def test_write_metadata_config_removes_temp_file_on_failure(tmp_path: Path) -> None:
+    path = tmp_path / "vdb.yaml"
+    path.write_text("repositories: {}\n", encoding="utf-8")
+
+    with patch("os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            _write_metadata_config(path, {"repositories": {"x": {}}})
+
+    assert os.listdir(tmp_path) == ["vdb.yaml"]
+    assert path.read_text(encoding="utf-8") == "repositories: {}\n"
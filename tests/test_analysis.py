@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import pandas as pd
 import pytest
 from httpx import AsyncClient
 
@@ -24,6 +25,30 @@ async def test_source_summary(client: AsyncClient) -> None:
     assert isinstance(data["metadata_fields"], list)
 
 
+@pytest.mark.asyncio
+async def test_source_summary_batches_queries(client: AsyncClient, mock_vdb) -> None:
+    """Counts, column stats and categorical values take a fixed number of queries."""
+    resp = await client.get("/api/v1/analysis/source-summary/harbison")
+    assert resp.status_code == 200
+    fields = {f["field"]: f for f in resp.json()["metadata_fields"]}
+    assert fields["effect"]["kind"] == "numeric"
+    assert fields["effect"]["min_value"] == pytest.approx(0.1)
+    assert fields["effect"]["max_value"] == pytest.approx(9.9)
+    assert fields["carbon_source"]["values"] == ["glucose", "galactose", "raffinose"]
+    assert "sample_id" not in fields
+    assert mock_vdb.query.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_source_summary_is_cached(client: AsyncClient, mock_vdb) -> None:
+    """Repeated summaries for the same VirtualDB do not touch DuckDB again."""
+    first = await client.get("/api/v1/analysis/source-summary/harbison")
+    calls = mock_vdb.query.call_count
+    second = await client.get("/api/v1/analysis/source-summary/harbison")
+    assert second.json() == first.json()
+    assert mock_vdb.query.call_count == calls
+
+
 @pytest.mark.asyncio
 async def test_source_summary_invalid_table(client: AsyncClient) -> None:
     """Test source summary with non-existent dataset."""
@@ -41,72 +66,200 @@ async def test_source_summary_no_meta_table(client: AsyncClient) -> None:
 
 
 @pytest.mark.asyncio
-async def test_binding_analysis(client: AsyncClient) -> None:
-    """Test POST /analysis/binding."""
-    resp = await client.post(
-        "/api/v1/analysis/binding",
-        json={
-            "datasets": ["harbison"],
-            "page": 1,
-            "page_size": 10,
-        },
-    )
+@pytest.mark.parametrize(
+    ("endpoint", "body"),
+    [
+        ("binding", {"datasets": ["harbison"], "page": 1, "page_size": 10}),
+        (
+            "binding",
+            {"datasets": ["harbison", "kemmeren"], "page": 1, "page_size": 100},
+        ),
+        (
+            "binding",
+            {
+                "datasets": ["harbison"],
+                "filters": {"harbison": {"carbon_source": ["glucose", "galactose"]}},
+                "numeric_filters": {
+                    "harbison": {"effect": {"min_value": 0.1, "max_value": 5.0}}
+                },
+                "page": 1,
+                "page_size": 50,
+            },
+        ),
+        ("perturbation", {"datasets": ["kemmeren"], "page": 1, "page_size": 20}),
+        (
+            "perturbation",
+            {
+                "datasets": ["kemmeren"],
+                "filters": {"kemmeren": {"carbon_source": ["glucose"]}},
+                "page": 1,
+                "page_size": 100,
+            },
+        ),
+    ],
+    ids=[
+        "binding",
+        "binding-multiple-datasets",
+        "binding-filters",
+        "perturbation",
+        "perturbation-filters",
+    ],
+)
+async def test_analysis_pages(client: AsyncClient, endpoint: str, body: dict) -> None:
+    """Test POST /analysis/binding and /analysis/perturbation page payloads."""
+    resp = await client.post(f"/api/v1/analysis/{endpoint}", json=body)
     assert resp.status_code == 200
     data = resp.json()
     assert isinstance(data, list)
-    assert len(data) == 1
-    result = data[0]
-    assert result["db_name"] == "harbison"
-    assert isinstance(result["data"], list)
-    assert result["total"] == 42
-    assert result["page"] == 1
-    assert result["page_size"] == 10
-    assert isinstance(result["has_next"], bool)
-    assert isinstance(result["columns"], list)
+    assert [result["db_name"] for result in data] == body["datasets"]
+    for result in data:
+        assert isinstance(result["data"], list)
+        assert result["total"] == 42
+        assert result["page"] == body["page"]
+        assert result["page_size"] == body["page_size"]
+        assert isinstance(result["has_next"], bool)
+        assert isinstance(result["columns"], list)
 
 
 @pytest.mark.asyncio
-async def test_binding_analysis_multiple_datasets(client: AsyncClient) -> None:
-    """Test binding analysis with multiple datasets."""
+async def test_binding_analysis_counts_total_separately(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """The total comes from a COUNT(*) run before the LIMITed page query."""
     resp = await client.post(
         "/api/v1/analysis/binding",
-        json={
-            "datasets": ["harbison", "kemmeren"],
-            "page": 1,
-            "page_size": 100,
-        },
+        json={"datasets": ["harbison"], "page": 1, "page_size": 10},
     )
     assert resp.status_code == 200
-    data = resp.json()
-    assert len(data) == 2
-    db_names = {result["db_name"] for result in data}
-    assert db_names == {"harbison", "kemmeren"}
+    assert resp.json()[0]["total"] == 42
+    count_call, page_call = mock_vdb.query.call_args_list
+    assert count_call.args[0] == "SELECT COUNT(*) AS total FROM harbison"
+    assert "OVER ()" not in page_call.args[0]
 
 
 @pytest.mark.asyncio
-async def test_binding_analysis_with_filters(client: AsyncClient) -> None:
-    """Test binding analysis with categorical and numeric filters."""
+async def test_binding_analysis_projects_requested_columns(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """Only requested columns present in the dataset are selected."""
     resp = await client.post(
         "/api/v1/analysis/binding",
-        json={
-            "datasets": ["harbison"],
-            "filters": {
-                "harbison": {
-                    "carbon_source": ["glucose", "galactose"],
-                }
-            },
-            "numeric_filters": {
-                "harbison": {
-                    "effect": {"min_value": 0.1, "max_value": 5.0},
-                }
+        json={"datasets": ["harbison"], "columns": ["effect", "carbon_source"]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()[0]["columns"] == ["effect"]
+    sql = mock_vdb.query.call_args.args[0]
+    assert sql.startswith("SELECT effect FROM harbison")
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_binds_pagination(client: AsyncClient, mock_vdb) -> None:
+    """Different pages reuse the same SQL text with bound LIMIT/OFFSET values."""
+    for page in (1, 2):
+        resp = await client.post(
+            "/api/v1/analysis/binding",
+            json={"datasets": ["harbison"], "page": page, "page_size": 10},
+        )
+        assert resp.status_code == 200
+    # Each page runs a COUNT(*) followed by the page query.
+    first, second = mock_vdb.query.call_args_list[1::2]
+    assert first.args[0] == second.args[0]
+    assert first.kwargs == {"page_limit": 10, "page_offset": 0}
+    assert second.kwargs == {"page_limit": 10, "page_offset": 10}
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_reuses_total_without_exact_count(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """Later pages skip COUNT(*) when the client opts out of exact counts."""
+    for page in (1, 2):
+        resp = await client.post(
+            "/api/v1/analysis/binding",
+            json={
+                "datasets": ["harbison"],
+                "page": page,
+                "page_size": 10,
+                "use_exact_count": False,
             },
-            "page": 1,
-            "page_size": 50,
-        },
+        )
+        assert resp.status_code == 200
+        assert resp.json()[0]["total"] == 42
+    sqls = [c.args[0] for c in mock_vdb.query.call_args_list]
+    assert [sql.startswith("SELECT COUNT(*)") for sql in sqls] == [True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_arrow_stream(client: AsyncClient) -> None:
+    """Clients accepting Arrow IPC get the page as a record batch stream."""
+    pa = pytest.importorskip("pyarrow")
+    resp = await client.post(
+        "/api/v1/analysis/binding",
+        json={"datasets": ["harbison"], "page_size": 10},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
     )
     assert resp.status_code == 200
-    data = resp.json()
-    assert len(data) == 1
+    assert resp.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert resp.headers["x-total-count"] == "42"
+    assert resp.headers["x-has-next"] == "true"
+    table = pa.ipc.open_stream(resp.content).read_all()
+    assert table.num_rows == 3
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_arrow_requires_single_dataset(
+    client: AsyncClient,
+) -> None:
+    resp = await client.post(
+        "/api/v1/analysis/binding",
+        json={"datasets": ["harbison", "kemmeren"]},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_empty_result_keeps_columns(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """A zero count skips the page query and still reports columns."""
+    mock_vdb.query.side_effect = lambda sql, **params: pd.DataFrame({"total": [0]})
+    resp = await client.post(
+        "/api/v1/analysis/binding",
+        json={"datasets": ["harbison"], "columns": ["sample_id"]},
+    )
+    assert resp.status_code == 200
+    result = resp.json()[0]
+    assert result["total"] == 0
+    assert result["data"] == []
+    assert result["columns"] == ["sample_id"]
+    assert result["has_next"] is False
+    assert mock_vdb.query.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_binding_analysis_serializes_pandas_values(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """Timestamps and missing values in records serialize without validation."""
+    mock_vdb.query.side_effect = lambda sql, **params: (
+        pd.DataFrame({"total": [2]})
+        if sql.startswith("SELECT COUNT(*)")
+        else pd.DataFrame(
+            {
+                "sample_id": pd.array([1, None], dtype="Int64"),
+                "collected": pd.to_datetime(["2024-01-02 03:04:05", None]),
+            }
+        )
+    )
+    resp = await client.post(
+        "/api/v1/analysis/binding", json={"datasets": ["harbison"]}
+    )
+    assert resp.status_code == 200
+    assert resp.json()[0]["data"] == [
+        {"sample_id": 1, "collected": "2024-01-02T03:04:05"},
+        {"sample_id": None, "collected": None},
+    ]
 
 
 @pytest.mark.asyncio
@@ -141,74 +294,81 @@ async def test_binding_analysis_invalid_dataset(client: AsyncClient) -> None:
 
 
 @pytest.mark.asyncio
-async def test_perturbation_analysis(client: AsyncClient) -> None:
-    """Test POST /analysis/perturbation."""
+async def test_correlation_matrix(client: AsyncClient) -> None:
+    """Test POST /analysis/correlation."""
     resp = await client.post(
-        "/api/v1/analysis/perturbation",
+        "/api/v1/analysis/correlation",
         json={
-            "datasets": ["kemmeren"],
-            "page": 1,
-            "page_size": 20,
+            "db_name": "harbison",
+            "method": "pearson",
+            "value_column": "effect",
+            "group_by": "regulator",
+            "max_items": 10,
         },
     )
     assert resp.status_code == 200
     data = resp.json()
-    assert isinstance(data, list)
-    assert len(data) == 1
-    result = data[0]
-    assert result["db_name"] == "kemmeren"
-    assert isinstance(result["data"], list)
-    assert result["total"] == 42
-    assert result["page"] == 1
-    assert result["page_size"] == 20
+    assert data["db_name"] == "harbison"
+    assert data["method"] == "pearson"
+    assert isinstance(data["labels"], list)
+    assert isinstance(data["cells"], list)
+    assert data["cells"], "no cells returned"
+    # Each cell should have row, col, value
+    assert all({"row", "col", "value"} <= cell.keys() for cell in data["cells"])
+    assert all(isinstance(cell["value"], (int, float)) for cell in data["cells"])
 
 
 @pytest.mark.asyncio
-async def test_perturbation_analysis_with_filters(client: AsyncClient) -> None:
-    """Test perturbation analysis with filters."""
+async def test_correlation_matrix_uses_single_aligned_query(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """All pairwise correlations come from one bound, target-aligned query."""
     resp = await client.post(
-        "/api/v1/analysis/perturbation",
+        "/api/v1/analysis/correlation",
         json={
-            "datasets": ["kemmeren"],
-            "filters": {
-                "kemmeren": {
-                    "carbon_source": ["glucose"],
-                }
-            },
-            "page": 1,
-            "page_size": 100,
+            "db_name": "harbison",
+            "value_column": "effect",
+            "group_by": "regulator",
+            "max_items": 10,
         },
     )
     assert resp.status_code == 200
     data = resp.json()
-    assert len(data) == 1
+    assert data["labels"] == ["TF1", "TF2", "TF3"]
+    assert len(data["cells"]) == 6
+    assert all(cell["value"] == pytest.approx(1.0) for cell in data["cells"])
+
+    vector_calls = [
+        call for call in mock_vdb.query.call_args_list if "align_key" in call.args[0]
+    ]
+    assert len(vector_calls) == 1
+    sql = vector_calls[0].args[0]
+    assert "target_locus_tag AS align_key" in sql
+    assert "'TF1'" not in sql
+    assert sorted(vector_calls[0].kwargs.values()) == ["TF1", "TF2", "TF3"]
 
 
 @pytest.mark.asyncio
-async def test_correlation_matrix(client: AsyncClient) -> None:
-    """Test POST /analysis/correlation."""
+async def test_correlation_matrix_aligns_by_position_without_target(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """Without a target column, rows are paired by a deterministic row_number()."""
+    mock_vdb.get_fields.side_effect = lambda table=None: (
+        ["sample_id", "regulator_symbol"]
+        if table and "meta" in table
+        else ["sample_id", "regulator_symbol", "effect"]
+    )
     resp = await client.post(
         "/api/v1/analysis/correlation",
-        json={
-            "db_name": "harbison",
-            "method": "pearson",
-            "value_column": "effect",
-            "group_by": "regulator",
-            "max_items": 10,
-        },
+        json={"db_name": "harbison", "value_column": "effect", "group_by": "regulator"},
     )
     assert resp.status_code == 200
-    data = resp.json()
-    assert data["db_name"] == "harbison"
-    assert data["method"] == "pearson"
-    assert isinstance(data["labels"], list)
-    assert isinstance(data["cells"], list)
-    # Each cell should have row, col, value
-    for cell in data["cells"]:
-        assert "row" in cell
-        assert "col" in cell
-        assert "value" in cell
-        assert isinstance(cell["value"], (int, float))
+    assert resp.json()["labels"] == ["TF1", "TF2", "TF3"]
+    sql = mock_vdb.query.call_args.args[0]
+    assert (
+        "row_number() OVER (PARTITION BY regulator_symbol ORDER BY sample_id, effect) "
+        "AS align_key" in sql
+    )
 
 
 @pytest.mark.asyncio
@@ -317,6 +477,37 @@ async def test_filter_options_multiple_datasets(client: AsyncClient) -> None:
     assert data["values"] == sorted(data["values"])
 
 
+@pytest.mark.asyncio
+async def test_filter_options_single_union_query(client: AsyncClient, mock_vdb) -> None:
+    """Values from every eligible dataset come from one UNION query."""
+    resp = await client.post(
+        "/api/v1/analysis/filter-options",
+        json={"datasets": ["harbison", "kemmeren", "nonexistent"], "column": "effect"},
+    )
+    assert resp.status_code == 200
+    assert mock_vdb.query.call_count == 1
+    sql = mock_vdb.query.call_args.args[0]
+    assert sql.count(" UNION ") == 1
+    assert "nonexistent" not in sql
+
+
+@pytest.mark.asyncio
+async def test_filter_options_stringify_typed_values(
+    client: AsyncClient, mock_vdb
+) -> None:
+    """Values are fetched typed and rendered with str(), not SQL VARCHAR casts."""
+    mock_vdb.query.side_effect = lambda sql, **params: pd.DataFrame(
+        {"value": [True, pd.Timestamp("2024-01-02")]}
+    )
+    resp = await client.post(
+        "/api/v1/analysis/filter-options",
+        json={"datasets": ["harbison"], "column": "effect"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["values"] == ["2024-01-02 00:00:00", "True"]
+    assert "CAST" not in mock_vdb.query.call_args.args[0]
+
+
 @pytest.mark.asyncio
 async def test_filter_options_empty_datasets(client: AsyncClient) -> None:
     """Test filter options with empty datasets list."""
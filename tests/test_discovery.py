@@ -37,6 +37,16 @@ async def test_list_datasets(client: AsyncClient) -> None:
         assert "is_comparative" in d
 
 
+@pytest.mark.asyncio
+async def test_list_datasets_caches_comparative_flags(
+    client: AsyncClient, mock_vdb
+) -> None:
+    for _ in range(2):
+        resp = await client.get("/api/v1/datasets")
+        assert resp.status_code == 200
+    assert mock_vdb._is_comparative.call_count == 2
+
+
 @pytest.mark.asyncio
 async def test_common_fields(client: AsyncClient) -> None:
     resp = await client.get("/api/v1/common-fields")
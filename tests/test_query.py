@@ -1,16 +1,227 @@
 from __future__ import annotations
 
+import datetime
+import re
+import time
+
 import pytest
 from httpx import AsyncClient
 import pandas as pd
 
-from app.routers._query_utils import _resolve_sample_identifier
+from app.routers._query_utils import (
+    _DISTINCT_VALUES_CACHE,
+    _DISTINCT_VALUES_TTL_SECONDS,
+    _SOURCE_SUMMARY_TTL_SECONDS,
+    _TABLE_STATS_CACHE,
+    _build_where_sql,
+    _column_type_map,
+    _df_to_records,
+    _distinct_values_by_field,
+    _filter_options_for_table,
+    _invalidate_schema_cache,
+    _is_numeric_column_type,
+    _resolve_sample_identifier,
+    _table_fields,
+    _table_set,
+    _validate_identifier,
+)
+from app.schemas import IntersectionRequest
 
 
 def test_resolve_sample_identifier_accepts_id() -> None:
     assert _resolve_sample_identifier(["id", "regulator_symbol"], "calling_cards_meta") == "id"
 
 
+@pytest.mark.parametrize("name", ["", "1abc", "drop table", "a-b", "r\u00e9g", "abc\n"])
+def test_validate_identifier_rejects_unsafe_names(name: str) -> None:
+    with pytest.raises(ValueError):
+        _validate_identifier(name)
+
+
+def test_validate_identifier_memoizes_valid_names() -> None:
+    _validate_identifier.cache_clear()
+    assert _validate_identifier("carbon_source") == "carbon_source"
+    assert _validate_identifier("carbon_source") == "carbon_source"
+    assert _validate_identifier.cache_info().hits == 1
+
+
+@pytest.mark.parametrize(
+    ("column_type", "expected"),
+    [
+        ("DOUBLE", True),
+        ("DECIMAL(18,2)", True),
+        ("ubigint", True),
+        ("VARCHAR", False),
+        ("INTEGER[]", False),
+        ("STRUCT(a INTEGER)", False),
+        (None, False),
+    ],
+)
+def test_is_numeric_column_type(column_type: str | None, expected: bool) -> None:
+    assert _is_numeric_column_type(column_type) is expected
+
+
+def test_column_type_map_is_cached_per_vdb(mock_vdb) -> None:
+    first = _column_type_map(mock_vdb, "harbison_meta")
+    assert _column_type_map(mock_vdb, "harbison_meta") is first
+    assert first["effect"] == "DOUBLE"
+    assert mock_vdb.describe.call_count == 1
+
+    _invalidate_schema_cache()
+    _column_type_map(mock_vdb, "harbison_meta")
+    assert mock_vdb.describe.call_count == 2
+
+
+def test_table_fields_are_cached_per_vdb(mock_vdb) -> None:
+    first = _table_fields(mock_vdb, "harbison")
+    assert _table_fields(mock_vdb, "harbison") is first
+    assert mock_vdb.get_fields.call_count == 1
+
+    _invalidate_schema_cache()
+    _table_fields(mock_vdb, "harbison")
+    assert mock_vdb.get_fields.call_count == 2
+
+
+def test_table_set_is_cached_per_vdb(mock_vdb) -> None:
+    tables = _table_set(mock_vdb)
+    assert "harbison_meta" in tables
+    assert _table_set(mock_vdb) is tables
+    assert mock_vdb.tables.call_count == 1
+
+    _invalidate_schema_cache()
+    _table_set(mock_vdb)
+    assert mock_vdb.tables.call_count == 2
+
+
+def test_filter_options_for_table_are_cached_per_vdb(mock_vdb) -> None:
+    options = _filter_options_for_table(mock_vdb, "harbison_meta")
+    assert {o.field: o.kind for o in options} == {
+        "regulator_symbol": "categorical",
+        "carbon_source": "categorical",
+        "effect": "numeric",
+    }
+    calls = mock_vdb.query.call_count
+    assert _filter_options_for_table(mock_vdb, "harbison_meta") is options
+    assert mock_vdb.query.call_count == calls
+
+
+def test_distinct_values_by_field_batches_per_type_and_keeps_str(mock_vdb) -> None:
+    mock_vdb.describe.return_value = pd.DataFrame(
+        {
+            "column_name": ["carbon_source", "regulator_symbol", "is_control"],
+            "column_type": ["VARCHAR", "VARCHAR", "BOOLEAN"],
+        }
+    )
+
+    def query(sql: str, **params: object) -> pd.DataFrame:
+        fields = re.findall(r"SELECT '(\w+)' AS field_name", sql)
+        values = [False, True] if fields == ["is_control"] else ["a", "b"]
+        return pd.DataFrame(
+            {
+                "field_name": [field for field in fields for _ in values],
+                "value": values * len(fields),
+            }
+        )
+
+    mock_vdb.query.side_effect = query
+    values = _distinct_values_by_field(
+        mock_vdb, "harbison_meta", ["carbon_source", "is_control", "regulator_symbol"]
+    )
+    assert values == {
+        "carbon_source": ["a", "b"],
+        "regulator_symbol": ["a", "b"],
+        "is_control": ["False", "True"],
+    }
+    assert mock_vdb.query.call_count == 2
+    assert all("CAST" not in call.args[0] for call in mock_vdb.query.call_args_list)
+
+
+def test_filter_options_for_table_expire(mock_vdb) -> None:
+    options = _filter_options_for_table(mock_vdb, "harbison_meta")
+    calls = mock_vdb.query.call_count
+    _TABLE_STATS_CACHE[mock_vdb].expire(
+        time.monotonic() + _SOURCE_SUMMARY_TTL_SECONDS + 1
+    )
+    assert _filter_options_for_table(mock_vdb, "harbison_meta") == options
+    assert mock_vdb.query.call_count == 2 * calls
+
+
+def test_df_to_records_matches_pandas_records() -> None:
+    df = pd.DataFrame(
+        {
+            "id": pd.array([1, None], dtype="Int64"),
+            "name": ["a", "b"],
+            "when": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+            "score": [0.5, float("nan")],
+        }
+    )
+    records = _df_to_records(df)
+    expected = df.to_dict(orient="records")
+    assert records[0] == expected[0]
+    assert records[1]["id"] is None
+    assert records[1]["when"] == expected[1]["when"]
+    assert records[1]["score"] != records[1]["score"]
+
+
+def test_build_where_sql_binds_integer_bounds_for_integer_columns() -> None:
+    body = IntersectionRequest(
+        datasets=["harbison"],
+        numeric_filters={
+            "harbison": {
+                "replicate": {"min_value": 1.5, "max_value": 3.5},
+                "effect": {"min_value": 1.5},
+            }
+        },
+    )
+    _, params = _build_where_sql(
+        body, "harbison", {"replicate": "INTEGER", "effect": "DOUBLE"}
+    )
+    assert params["harbison__replicate_min"] == 2
+    assert params["harbison__replicate_max"] == 3
+    assert isinstance(params["harbison__replicate_min"], int)
+    assert params["harbison__effect_min"] == 1.5
+
+
+@pytest.mark.parametrize("bound", ["inf", "-inf", "nan"])
+def test_build_where_sql_rejects_non_finite_bounds(bound: str) -> None:
+    body = IntersectionRequest(
+        datasets=["harbison"],
+        numeric_filters={"harbison": {"replicate": {"min_value": float(bound)}}},
+    )
+    with pytest.raises(ValueError, match="must be finite"):
+        _build_where_sql(body, "harbison", {"replicate": "INTEGER"})
+
+
+@pytest.mark.asyncio
+async def test_intersection_rejects_non_finite_bounds(client: AsyncClient) -> None:
+    resp = await client.post(
+        "/api/v1/active-set/intersection",
+        json={
+            "datasets": ["harbison"],
+            "numeric_filters": {"harbison": {"effect": {"max_value": "Infinity"}}},
+        },
+    )
+    assert resp.status_code == 400
+    assert "finite" in resp.json()["detail"]
+
+
+def test_build_where_sql_binds_filter_values() -> None:
+    body = IntersectionRequest(
+        datasets=["harbison"],
+        filters={"harbison": {"carbon_source": ["glucose", "it's", ""]}},
+        numeric_filters={"harbison": {"effect": {"min_value": 0.5}}},
+    )
+    where_sql, params = _build_where_sql(body, "harbison")
+    assert "glucose" not in where_sql
+    assert "carbon_source IN ($harbison__carbon_source_0" in where_sql
+    assert "effect >= $harbison__effect_min" in where_sql
+    assert params == {
+        "harbison__carbon_source_0": "glucose",
+        "harbison__carbon_source_1": "it's",
+        "harbison__effect_min": 0.5,
+    }
+
+
 @pytest.mark.asyncio
 async def test_execute_query(client: AsyncClient) -> None:
     resp = await client.post(
@@ -32,6 +243,108 @@ async def test_execute_query(client: AsyncClient) -> None:
     assert data["page"] == 1
 
 
+@pytest.mark.asyncio
+async def test_execute_query_counts_total_separately(
+    client: AsyncClient, test_app
+) -> None:
+    resp = await client.post(
+        "/api/v1/query",
+        json={"sql": "SELECT * FROM harbison_meta", "page": 1, "page_size": 10},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total"] == 42
+    assert data["has_next"] is True
+    count_call, page_call = test_app.state.vdb.query.call_args_list
+    assert count_call.args[0].startswith("SELECT COUNT(*) AS total FROM (")
+    assert page_call.args[0].endswith("LIMIT 10 OFFSET 0")
+    assert "OVER ()" not in page_call.args[0]
+
+
+@pytest.mark.asyncio
+async def test_execute_query_keyset_pagination(client: AsyncClient, test_app) -> None:
+    body = {"sql": "SELECT * FROM harbison_meta", "order_by": "sample_id"}
+    resp = await client.post("/api/v1/query", json={**body, "page_size": 2})
+    assert resp.status_code == 200
+    first = resp.json()
+    assert [row["sample_id"] for row in first["data"]] == [1, 2]
+    assert first["total"] is None
+    assert first["has_next"] is True
+
+    resp = await client.post(
+        "/api/v1/query",
+        json={**body, "page_size": 2, "cursor": first["next_cursor"]},
+    )
+    assert resp.status_code == 200
+    sql = test_app.state.vdb.query.call_args.args[0]
+    assert "WHERE sample_id >= $__cursor OR sample_id IS NULL" in sql
+    assert sql.endswith("ORDER BY sample_id NULLS LAST, _q LIMIT 3 OFFSET 1")
+    assert test_app.state.vdb.query.call_args.kwargs == {"__cursor": 2}
+
+
+@pytest.mark.asyncio
+async def test_execute_query_keyset_pages_through_ties_and_nulls(
+    client: AsyncClient, test_app
+) -> None:
+    pages = iter(
+        [
+            pd.DataFrame({"k": [1, 2, 2]}),
+            pd.DataFrame({"k": [2, 2, 2]}),
+            pd.DataFrame({"k": pd.array([2, None, None], "Int64")}),
+            pd.DataFrame({"k": pd.array([None, None], "Int64")}),
+        ]
+    )
+    test_app.state.vdb.query.side_effect = lambda sql, **params: next(pages)
+    body = {"sql": "SELECT * FROM t", "order_by": "k", "page_size": 2}
+    seen = []
+    cursor = None
+    for _ in range(4):
+        resp = await client.post("/api/v1/query", json={**body, "cursor": cursor})
+        assert resp.status_code == 200
+        seen.append(test_app.state.vdb.query.call_args)
+        cursor = resp.json()["next_cursor"]
+    assert cursor is None
+    # Rows sharing the last key are skipped rather than filtered out.
+    assert seen[1].args[0].endswith("OFFSET 1")
+    assert seen[1].kwargs == {"__cursor": 2}
+    assert seen[2].args[0].endswith("OFFSET 3")
+    # A NULL last key continues within the NULLs, which sort last.
+    assert "WHERE k IS NULL " in seen[3].args[0]
+    assert seen[3].args[0].endswith("OFFSET 1")
+
+
+@pytest.mark.asyncio
+async def test_execute_query_keyset_rejects_page(client: AsyncClient) -> None:
+    resp = await client.post(
+        "/api/v1/query",
+        json={"sql": "SELECT 1 AS id", "order_by": "id", "page": 2},
+    )
+    assert resp.status_code == 400
+    assert "cursor" in resp.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_execute_query_keyset_requires_order_by_in_result(
+    client: AsyncClient,
+) -> None:
+    resp = await client.post(
+        "/api/v1/query",
+        json={"sql": "SELECT * FROM harbison_meta", "order_by": "SAMPLE_ID"},
+    )
+    assert resp.status_code == 400
+    assert "not in the query result" in resp.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_execute_query_rejects_invalid_cursor(client: AsyncClient) -> None:
+    resp = await client.post(
+        "/api/v1/query",
+        json={"sql": "SELECT 1", "order_by": "id", "cursor": "not-a-cursor"},
+    )
+    assert resp.status_code == 400
+    assert "invalid cursor" in resp.json()["detail"].lower()
+
+
 @pytest.mark.asyncio
 async def test_sample_rows(client: AsyncClient) -> None:
     resp = await client.get("/api/v1/tables/harbison/sample?n=5")
@@ -41,6 +354,34 @@ async def test_sample_rows(client: AsyncClient) -> None:
     assert len(rows) > 0
 
 
+@pytest.mark.asyncio
+async def test_sample_rows_serializes_pandas_values(
+    client: AsyncClient, test_app
+) -> None:
+    test_app.state.vdb.query.side_effect = lambda sql, **params: pd.DataFrame(
+        {"when": pd.to_datetime(["2024-01-01"]), "count": pd.array([None], "Int64")}
+    )
+    resp = await client.get("/api/v1/tables/harbison/sample?n=1")
+    assert resp.status_code == 200
+    assert resp.json() == [{"when": "2024-01-01T00:00:00", "count": None}]
+
+
+@pytest.mark.asyncio
+async def test_sample_rows_serializes_bytes_and_timedelta(
+    client: AsyncClient, test_app
+) -> None:
+    test_app.state.vdb.query.side_effect = lambda sql, **params: pd.DataFrame(
+        {
+            "blob": pd.Series([b"ACGT"], dtype=object),
+            "elapsed": pd.to_timedelta(["90s"]),
+            "delay": pd.Series([datetime.timedelta(minutes=1)], dtype=object),
+        }
+    )
+    resp = await client.get("/api/v1/tables/harbison/sample?n=1")
+    assert resp.status_code == 200
+    assert resp.json() == [{"blob": "ACGT", "elapsed": 90.0, "delay": 60.0}]
+
+
 @pytest.mark.asyncio
 async def test_distinct_values(client: AsyncClient) -> None:
     resp = await client.get("/api/v1/tables/harbison_meta/distinct/carbon_source")
@@ -49,6 +390,27 @@ async def test_distinct_values(client: AsyncClient) -> None:
     assert isinstance(values, list)
 
 
+@pytest.mark.asyncio
+async def test_distinct_values_are_cached(client: AsyncClient, test_app) -> None:
+    for _ in range(2):
+        resp = await client.get("/api/v1/tables/harbison_meta/distinct/carbon_source")
+        assert resp.json() == ["glucose", "galactose", "raffinose"]
+    assert test_app.state.vdb.query.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_distinct_values_expire_after_a_minute(
+    client: AsyncClient, test_app
+) -> None:
+    url = "/api/v1/tables/harbison_meta/distinct/carbon_source"
+    await client.get(url)
+    _DISTINCT_VALUES_CACHE[test_app.state.vdb].expire(
+        time.monotonic() + _DISTINCT_VALUES_TTL_SECONDS + 1
+    )
+    await client.get(url)
+    assert test_app.state.vdb.query.call_count == 2
+
+
 @pytest.mark.asyncio
 async def test_row_count(client: AsyncClient) -> None:
     resp = await client.get("/api/v1/tables/harbison/count")
@@ -57,6 +419,14 @@ async def test_row_count(client: AsyncClient) -> None:
     assert count == 42
 
 
+@pytest.mark.asyncio
+async def test_row_count_is_cached(client: AsyncClient, test_app) -> None:
+    for _ in range(2):
+        resp = await client.get("/api/v1/tables/harbison/count")
+        assert resp.json() == 42
+    assert test_app.state.vdb.query.call_count == 1
+
+
 @pytest.mark.asyncio
 async def test_filter_options(client: AsyncClient) -> None:
     resp = await client.get("/api/v1/active-set/filter-options/harbison_meta")
@@ -75,6 +445,20 @@ async def test_filter_options(client: AsyncClient) -> None:
             assert "values" in opt
 
 
+@pytest.mark.asyncio
+async def test_filter_options_batches_ranges_and_values(
+    client: AsyncClient, test_app
+) -> None:
+    resp = await client.get("/api/v1/active-set/filter-options/harbison_meta")
+    assert resp.status_code == 200
+    options = {opt["field"]: opt for opt in resp.json()}
+    assert list(options) == ["regulator_symbol", "carbon_source", "effect"]
+    assert options["effect"]["min_value"] == 0.1
+    assert options["effect"]["max_value"] == 9.9
+    assert options["carbon_source"]["values"] == ["glucose", "galactose", "raffinose"]
+    assert test_app.state.vdb.query.call_count == 2
+
+
 @pytest.mark.asyncio
 async def test_filter_options_configured_dataset_without_registered_tables_returns_empty(
     client: AsyncClient, test_app
@@ -86,6 +470,8 @@ async def test_filter_options_configured_dataset_without_registered_tables_retur
     resp = await client.get("/api/v1/active-set/filter-options/calling_cards_meta")
     assert resp.status_code == 200
     assert resp.json() == []
+    test_app.state.vdb.query.assert_not_called()
+    test_app.state.vdb.get_fields.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -105,6 +491,35 @@ async def test_intersection(client: AsyncClient) -> None:
         assert "count" in cell
 
 
+@pytest.mark.asyncio
+async def test_intersection_counts_overlaps_in_one_query(
+    client: AsyncClient, test_app
+) -> None:
+    resp = await client.post(
+        "/api/v1/active-set/intersection",
+        json={"datasets": ["harbison", "kemmeren"], "filters": {}},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"row": "harbison", "col": "harbison", "count": 3},
+        {"row": "harbison", "col": "kemmeren", "count": 2},
+        {"row": "kemmeren", "col": "kemmeren", "count": 3},
+    ]
+    assert test_app.state.vdb.query.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_intersection_without_filters_skips_schema_lookup(
+    client: AsyncClient, test_app
+) -> None:
+    resp = await client.post(
+        "/api/v1/active-set/intersection",
+        json={"datasets": ["harbison", "kemmeren"], "filters": {}},
+    )
+    assert resp.status_code == 200
+    test_app.state.vdb.describe.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_intersection_supports_numeric_filters(
     client: AsyncClient, test_app
@@ -169,14 +584,15 @@ async def test_intersection_uses_supplemental_regulators_without_join_when_unfil
     original_get_fields = vdb.get_fields.side_effect
     original_query = vdb.query.side_effect
 
+    calling_cards_fields = {
+        "calling_cards_meta": ["id", "target_locus_tag"],
+        "calling_cards_regmeta": ["id", "regulator_locus_tag", "regulator_symbol"],
+        "calling_cards": ["id", "target_locus_tag"],
+    }
+
     def get_fields_side_effect(table: str | None = None):
-        if table == "calling_cards_meta":
-            return ["id", "target_locus_tag"]
-        if table == "calling_cards_regmeta":
-            return ["id", "regulator_locus_tag", "regulator_symbol"]
-        if table == "calling_cards":
-            return ["id", "target_locus_tag"]
-        return original_get_fields(table)
+        fields = calling_cards_fields.get(table)
+        return fields if fields is not None else original_get_fields(table)
 
     def query_side_effect(sql: str, **params: object):
         sql_lower = sql.lower()
@@ -184,7 +600,7 @@ async def test_intersection_uses_supplemental_regulators_without_join_when_unfil
             " as regulator" in sql_lower
             and "from calling_cards_regmeta as src" in sql_lower
         ):
-            return pd.DataFrame({"regulator": ["TF1", "TF2", "TF3"]})
+            return pd.DataFrame({"ds_a": [0], "ds_b": [0], "overlap": [3]})
         return original_query(sql, **params)
 
     vdb.get_fields.side_effect = get_fields_side_effect